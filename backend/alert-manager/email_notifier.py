@@ -1,6 +1,8 @@
 import os
+import json
 import aiohttp
 import logging
+from typing import Optional
 from dotenv import load_dotenv
 
 # Load environment variables
@@ -13,6 +15,37 @@ ENABLE_EMAIL = os.getenv("ENABLE_EMAIL", "false").lower() == "true"
 
 logger = logging.getLogger("alert_manager")
 
+RESEND_URL = "https://api.resend.com/emails"
+RESEND_HEADERS = {
+    "Authorization": f"Bearer {RESEND_API_KEY}",
+    "Content-Type": "application/json"
+}
+# The from/to part of every request body, encoded once without its closing brace
+_PAYLOAD_PREFIX = json.dumps({"from": EMAIL_FROM, "to": [EMAIL_TO]}, separators=(",", ":"))[:-1]
+
+def _encode_payload(subject: str, html_content: str) -> bytes:
+    """Append the per-email fields to the pre-encoded static payload"""
+    return f'{_PAYLOAD_PREFIX},"subject":{json.dumps(subject)},"html":{json.dumps(html_content)}}}'.encode()
+
+# One keep-alive HTTPS connection pool to the Resend API, reused across emails
+_session: Optional[aiohttp.ClientSession] = None
+
+def _get_session() -> aiohttp.ClientSession:
+    global _session
+    if _session is None or _session.closed:
+        _session = aiohttp.ClientSession(
+            connector=aiohttp.TCPConnector(limit=4, keepalive_timeout=60),
+            timeout=aiohttp.ClientTimeout(total=10)
+        )
+    return _session
+
+async def close_email_session():
+    """Close the shared Resend session. Called on service shutdown."""
+    global _session
+    if _session is not None and not _session.closed:
+        await _session.close()
+    _session = None
+
 async def send_alert_email(subject: str, html_content: str):
     """
     Sends an email using Resend API asynchronously.
@@ -26,30 +59,17 @@ async def send_alert_email(subject: str, html_content: str):
         logger.error("RESEND_API_KEY is missing.")
         return False
 
-    url = "https://api.resend.com/emails"
-    
-    headers = {
-        "Authorization": f"Bearer {RESEND_API_KEY}",
-        "Content-Type": "application/json"
-    }
-    
-    payload = {
-        "from": EMAIL_FROM,
-        "to": [EMAIL_TO],
-        "subject": subject,
-        "html": html_content
-    }
+    body = _encode_payload(subject, html_content)
     
     try:
-        async with aiohttp.ClientSession() as session:
-            async with session.post(url, json=payload, headers=headers) as response:
-                if response.status in [200, 201, 202]:
-                    logger.info(f"Email sent successfully to {EMAIL_TO}")
-                    return True
-                else:
-                    text = await response.text()
-                    logger.error(f"Failed to send email. Status: {response.status}, Response: {text}")
-                    return False
+        async with _get_session().post(RESEND_URL, data=body, headers=RESEND_HEADERS) as response:
+            if response.status in [200, 201, 202]:
+                logger.info("Email sent successfully to %s", EMAIL_TO)
+                return True
+            else:
+                text = await response.text()
+                logger.error("Failed to send email. Status: %s, Response: %s", response.status, text)
+                return False
     except Exception as e:
-        logger.error(f"Failed to send email: {str(e)}")
+        logger.error("Failed to send email: %s", e)
         return False
@@ -1,14 +1,25 @@
 import os
+import json
+import math
+import time
+import asyncio
 import uuid
+from html import escape
+from collections import defaultdict, deque
+from dataclasses import dataclass
+from itertools import islice
 from datetime import datetime
 from contextlib import asynccontextmanager
-from typing import List, Optional
+from typing import Deque, Dict, List, Optional, Tuple
 
 from fastapi import FastAPI, HTTPException
 from fastapi.middleware.cors import CORSMiddleware
-from pydantic import BaseModel
+from fastapi.responses import ORJSONResponse
+from pydantic import BaseModel, PrivateAttr
 import aiohttp
 
+from email_notifier import ENABLE_EMAIL, send_alert_email, close_email_session
+
 PORT = int(os.environ.get("PORT", 8003))
 API_GATEWAY_URL = os.environ.get("API_GATEWAY_URL", "http://localhost:3001")
 RESPONSE_ENGINE_URL = os.environ.get("RESPONSE_ENGINE_URL", "http://localhost:8004")
@@ -37,6 +48,8 @@ class Alert(BaseModel):
     recommendation: Optional[str] = None
     anomaly_id: Optional[str] = None
     rule_id: Optional[str] = None
+    # Epoch seconds for internal timing math; `timestamp` stays ISO for API consumers
+    _created_at: float = PrivateAttr(default=0.0)
 
 class HealthResponse(BaseModel):
     status: str = "healthy"
@@ -44,79 +57,105 @@ class HealthResponse(BaseModel):
     version: str = "1.0.0"
     alerts_generated: int = 0
 
+@dataclass(frozen=True)
+class AlertTemplate:
+    __slots__ = ("title", "severity")
+    title: str
+    severity: str
+
 ALERT_TEMPLATES = {
-    "sql_injection": {
-        "title": "🚨 SQL Injection Attempt",
-        "severity": "critical",
-    },
-    "rate_spike": {
-        "title": "⚡ Potential DDoS Attack",
-        "severity": "warning",
-    },
-    "high_cpu": {
-        "title": "🔥 High CPU Usage Alert",
-        "severity": "warning",
-    },
-    "high_memory": {
-        "title": "💾 Critical Memory Usage",
-        "severity": "critical",
-    },
-    "high_network": {
-        "title": "📡 High Network Traffic (Data Exfiltration Risk)",
-        "severity": "warning",
-    },
-    "brute_force": {
-        "title": "🔐 Brute Force Attack Detected",
-        "severity": "critical",
-    },
+    "sql_injection": AlertTemplate("🚨 SQL Injection Attempt", "critical"),
+    "rate_spike": AlertTemplate("⚡ Potential DDoS Attack", "warning"),
+    "high_cpu": AlertTemplate("🔥 High CPU Usage Alert", "warning"),
+    "high_memory": AlertTemplate("💾 Critical Memory Usage", "critical"),
+    "high_network": AlertTemplate("📡 High Network Traffic (Data Exfiltration Risk)", "warning"),
+    "brute_force": AlertTemplate("🔐 Brute Force Attack Detected", "critical"),
+}
+
+# Email token buckets per severity: (refill rate in tokens/sec, burst capacity).
+# Severities without an entry are never emailed.
+NOTIFY_RATE_LIMITS = {
+    "critical": (1 / 30, 5),
+    "high": (1 / 60, 3),
 }
+# Severities that actually have an enabled channel; empty when email is off
+NOTIFY_SEVERITIES = frozenset(NOTIFY_RATE_LIMITS) if ENABLE_EMAIL else frozenset()
+NOTIFY_WORKERS = 2
+NOTIFY_QUEUE_MAX = 1000
+
+MAX_ALERT_HISTORY = 100
 
 alerts_generated = 0
-alert_history: List[Alert] = []
+# Running totals so /alerts/stats never rescans alert_history
+alerts_acknowledged = 0
+ack_latency_total = 0.0
+severity_counts: Dict[str, int] = defaultdict(int)
+rule_counts: Dict[str, int] = defaultdict(int)
+# Ring buffer of recent alerts; appending past the cap drops the oldest in O(1)
+alert_history: Deque[Alert] = deque(maxlen=MAX_ALERT_HISTORY)
+# alert.id -> Alert for every alert still in alert_history
+alert_index: Dict[str, Alert] = {}
+
+def sanitize_floats(value):
+    """Replace NaN/Inf (not valid JSON) with None, recursing into dicts and lists"""
+    if isinstance(value, float):
+        return value if math.isfinite(value) else None
+    if isinstance(value, dict):
+        return {k: sanitize_floats(v) for k, v in value.items()}
+    if isinstance(value, list):
+        return [sanitize_floats(v) for v in value]
+    return value
+
+def alert_source(evidence: dict) -> str:
+    source = evidence.get("service", "Unknown Service")
+    if not source or source == "Unknown Service":
+        source = evidence.get("source_ip", "Unknown")
+    return source
 
 def generate_alert(anomaly: AnomalySignal) -> Alert:
     global alerts_generated
 
-    # Get template config or empty dict
-    template_config = ALERT_TEMPLATES.get(anomaly.rule_id, {})
-
-    # determining severity: default to anomaly severity if not in template
-    severity = template_config.get("severity", anomaly.severity)
+    template_config = ALERT_TEMPLATES.get(anomaly.rule_id)
 
-    # If it's an ML rule (starts with ml_) or explicitly crit, trust the anomaly
-    if anomaly.rule_id.startswith("ml_") or anomaly.severity == "critical":
+    # Template severity applies unless the rule is ML-driven (ml_*) or already critical
+    if template_config is None or anomaly.severity == "critical" or anomaly.rule_id.startswith("ml_"):
         severity = anomaly.severity
+        title = template_config.title if template_config else f"⚠️ {anomaly.rule_name}"
+    else:
+        severity = template_config.severity
+        title = template_config.title
 
-    template = {
-        "title": template_config.get("title", f"⚠️ {anomaly.rule_name}"),
-        "severity": severity,
-    }
+    # Cleaned once here so every later read and re-serialization is JSON-safe
+    evidence = sanitize_floats(anomaly.evidence)
 
-    source = anomaly.evidence.get("service", "Unknown Service")
-    if not source or source == "Unknown Service":
-        source = anomaly.evidence.get("source_ip", "Unknown")
+    source = alert_source(evidence)
 
     description = generate_description(anomaly)
 
+    # One clock read per alert: epoch for internal math, ISO for the API
+    now = time.time()
     alert = Alert(
-        id=str(uuid.uuid4()),
-        title=template["title"],
+        id=uuid.uuid4().hex,
+        title=title,
         description=description,
-        severity=template.get("severity", anomaly.severity),
+        severity=severity,
         source=source,
-        timestamp=datetime.utcnow().isoformat() + "Z",
+        timestamp=datetime.utcfromtimestamp(now).isoformat() + "Z",
         acknowledged=False,
-        evidence=anomaly.evidence,
+        evidence=evidence,
         recommendation=anomaly.recommendation,
         anomaly_id=anomaly.anomaly_id,
         rule_id=anomaly.rule_id,
     )
+    alert._created_at = now
 
     alerts_generated += 1
+    severity_counts[severity] += 1
+    rule_counts[anomaly.rule_id] += 1
+    if len(alert_history) == MAX_ALERT_HISTORY:
+        alert_index.pop(alert_history[0].id, None)
     alert_history.append(alert)
-
-    if len(alert_history) > 100:
-        alert_history.pop(0)
+    alert_index[alert.id] = alert
 
     return alert
 
@@ -156,18 +195,125 @@ def generate_description(anomaly: AnomalySignal) -> str:
     else:
         return anomaly.description
 
+# Keep-alive connections to the gateway and response engine, shared by every alert
+http_session: Optional[aiohttp.ClientSession] = None
+JSON_HEADERS = {"Content-Type": "application/json"}
+
+def get_http_session() -> aiohttp.ClientSession:
+    global http_session
+    if http_session is None or http_session.closed:
+        http_session = aiohttp.ClientSession(connector=aiohttp.TCPConnector(limit=16, keepalive_timeout=60))
+    return http_session
+
+SEVERITY_RANK = {"critical": 0, "high": 1, "warning": 2, "medium": 3, "low": 4}
+# Indexed by SEVERITY_RANK; the last entry covers unknown severities
+SEVERITY_COLORS = ("#d32f2f", "#f57c00", "#fbc02d", "#1976d2", "#388e3c", "#9e9e9e")
+
+EMAIL_TEMPLATE = (
+    "<h2 style=\"color:{color}\">{title}</h2>"
+    "<p>{description}</p>"
+    "<p><b>Severity:</b> {severity}<br><b>Source:</b> {source}<br><b>Time:</b> {timestamp}</p>"
+    "<p><b>Recommendation:</b> {recommendation}</p>"
+    "<pre>{evidence}</pre>"
+    "{suppressed}"
+)
+SUPPRESSED_TEMPLATE = "<p><i>{count} more {severity} alerts suppressed in the last {elapsed}s.</i></p>"
+
+# severity -> [tokens, last_refill]
+notify_buckets: Dict[str, List[float]] = {}
+# severity -> [suppressed_count, first_suppressed_at]
+notify_suppressed: Dict[str, List[float]] = {}
+# Bounded hand-off to the email workers (created in lifespan); a full queue drops rather than blocks
+notify_queue: Optional[asyncio.Queue] = None
+
+def take_notify_token(severity: str) -> bool:
+    rate, capacity = NOTIFY_RATE_LIMITS[severity]
+    now = time.monotonic()
+    bucket = notify_buckets.setdefault(severity, [capacity, now])
+    tokens = min(capacity, bucket[0] + (now - bucket[1]) * rate)
+    bucket[1] = now
+    if tokens >= 1:
+        bucket[0] = tokens - 1
+        return True
+    bucket[0] = tokens
+    return False
+
+def render_alert_email(alert: Alert, suppressed: Optional[List[float]]):
+    subject = f"[{alert.severity.upper()}] {alert.title}"
+    summary = ""
+    if suppressed:
+        summary = SUPPRESSED_TEMPLATE.format(
+            count=suppressed[0],
+            severity=alert.severity,
+            elapsed=int(time.monotonic() - suppressed[1])
+        )
+    html_content = EMAIL_TEMPLATE.format_map({
+        "color": SEVERITY_COLORS[SEVERITY_RANK.get(alert.severity, -1)],
+        "title": escape(alert.title),
+        "description": escape(alert.description),
+        "severity": alert.severity,
+        "source": escape(alert.source),
+        "timestamp": alert.timestamp,
+        "recommendation": escape(alert.recommendation or "-"),
+        "evidence": escape(json.dumps(alert.evidence or {}, separators=(",", ":"))),
+        "suppressed": summary,
+    })
+    return subject, html_content
+
+def route_alert(alert: Alert):
+    """Queue an email for the alert if its severity is notifiable and its bucket has a token.
+
+    Alerts refused by the rate limiter are counted and summarized in the next
+    email that goes out for the same severity. Sending happens on the
+    notify workers, so this never waits on the network.
+    """
+    if alert.severity not in NOTIFY_SEVERITIES or notify_queue is None:
+        return
+
+    if not take_notify_token(alert.severity):
+        suppressed = notify_suppressed.setdefault(alert.severity, [0, time.monotonic()])
+        suppressed[0] += 1
+        return
+
+    try:
+        notify_queue.put_nowait((alert, notify_suppressed.pop(alert.severity, None)))
+    except asyncio.QueueFull:
+        print(f"Notification queue full, dropping email for alert {alert.id}")
+
+async def notify_worker():
+    while True:
+        alert, suppressed = await notify_queue.get()
+        try:
+            await send_alert_email(*render_alert_email(alert, suppressed))
+        except Exception as e:
+            print(f"Notification worker error: {e}")
+        finally:
+            notify_queue.task_done()
+
 @asynccontextmanager
 async def lifespan(app: FastAPI):
+    global notify_queue
     print(f"Alert Manager running on port {PORT}")
     print(f"Gateway URL: {API_GATEWAY_URL}")
+    workers = []
+    if NOTIFY_SEVERITIES:
+        notify_queue = asyncio.Queue(maxsize=NOTIFY_QUEUE_MAX)
+        workers = [asyncio.create_task(notify_worker()) for _ in range(NOTIFY_WORKERS)]
     yield
+    for task in workers:
+        task.cancel()
+    await asyncio.gather(*workers, return_exceptions=True)
+    await close_email_session()
+    if http_session is not None:
+        await http_session.close()
     print("Alert Manager shutting down...")
 
 app = FastAPI(
     title="Threat_Ops.ai - Alert Manager",
     description="Alert generation service",
     version="1.0.0",
-    lifespan=lifespan
+    lifespan=lifespan,
+    default_response_class=ORJSONResponse
 )
 
 app.add_middleware(
@@ -188,13 +334,31 @@ async def health_check():
     )
 
 @app.get("/alerts", tags=["Alerts"])
-async def list_alerts(limit: int = 50):
+async def list_alerts(limit: int = 50, severity: Optional[str] = None, active: bool = False):
+    # alert_history is already in creation order, so newest-first is a reverse
+    # walk that filters inline and stops after `limit` matches; no sort needed
+    alerts = reversed(alert_history)
+    if severity is not None or active:
+        alerts = (
+            a for a in alerts
+            if (severity is None or a.severity == severity) and not (active and a.acknowledged)
+        )
     return {
-        "alerts": alert_history[-limit:][::-1],
+        "alerts": list(islice(alerts, max(limit, 0))),
         "count": len(alert_history),
         "total_generated": alerts_generated
     }
 
+@app.get("/alerts/stats", tags=["Alerts"])
+async def alert_stats():
+    return {
+        "total_generated": alerts_generated,
+        "acknowledged": alerts_acknowledged,
+        "mean_time_to_acknowledge_s": round(ack_latency_total / alerts_acknowledged, 2) if alerts_acknowledged else 0,
+        "by_severity": dict(severity_counts),
+        "by_rule": dict(rule_counts)
+    }
+
 @app.post("/internal/anomaly", tags=["Internal"])
 async def receive_anomaly(anomaly: AnomalySignal):
     try:
@@ -202,24 +366,7 @@ async def receive_anomaly(anomaly: AnomalySignal):
 
         print(f"Alert generated: {alert.title} ({alert.severity})")
 
-        await forward_to_gateway(alert)
-
-        try:
-            async with aiohttp.ClientSession() as session:
-                async with session.post(
-                    f"{RESPONSE_ENGINE_URL}/execute",
-                    json=alert.model_dump(),
-                    timeout=aiohttp.ClientTimeout(total=5)
-                ) as resp:
-                    if resp.status == 200:
-                        execution = await resp.json()
-                        actions = execution.get("actions_executed", 0)
-                        if actions > 0:
-                            print(f"Response Engine executed {actions} actions")
-                    else:
-                        print(f"Response Engine responded: {resp.status}")
-        except Exception as e:
-            print(f"Could not reach Response Engine: {e}")
+        await dispatch_alert(alert)
 
         return {
             "status": "alert_generated",
@@ -231,33 +378,94 @@ async def receive_anomaly(anomaly: AnomalySignal):
         print(f"Alert generation error: {e}")
         raise HTTPException(status_code=500, detail=str(e))
 
-async def forward_to_gateway(alert: Alert):
+@app.post("/internal/anomalies", tags=["Internal"])
+async def receive_anomalies(anomalies: List[AnomalySignal]):
+    """Batch ingest: keep one anomaly per (source, rule), then alert on each survivor.
+
+    Within a (source, rule) pair the most severe anomaly wins; ties go to the
+    later one. Different rules firing on the same source stay separate alerts.
+    Downstream posts for the surviving alerts run concurrently.
+    """
+    try:
+        # (source, rule_id) -> (severity rank, anomaly); lower rank is more severe
+        kept: Dict[Tuple[str, str], Tuple[int, AnomalySignal]] = {}
+        for anomaly in anomalies:
+            key = (alert_source(anomaly.evidence), anomaly.rule_id)
+            rank = SEVERITY_RANK.get(anomaly.severity, len(SEVERITY_RANK))
+            if key not in kept or rank <= kept[key][0]:
+                kept[key] = (rank, anomaly)
+
+        alerts = [generate_alert(anomaly) for _, anomaly in kept.values()]
+        for alert in alerts:
+            print(f"Alert generated: {alert.title} ({alert.severity})")
+
+        await asyncio.gather(*(dispatch_alert(alert) for alert in alerts))
+
+        return {
+            "status": "alerts_generated",
+            "received": len(anomalies),
+            "alerts": [{"alert_id": alert.id, "severity": alert.severity} for alert in alerts]
+        }
+
+    except Exception as e:
+        print(f"Alert generation error: {e}")
+        raise HTTPException(status_code=500, detail=str(e))
+
+async def dispatch_alert(alert: Alert):
+    """Broadcast to the gateway, queue notifications and trigger the response engine"""
+    # Encoded to JSON bytes once and sent as-is to both the gateway and response engine
+    body = alert.model_dump_json().encode()
+    await forward_to_gateway(alert, body)
+    route_alert(alert)
+
+    try:
+        async with get_http_session().post(
+            f"{RESPONSE_ENGINE_URL}/execute",
+            data=body,
+            headers=JSON_HEADERS,
+            timeout=aiohttp.ClientTimeout(total=5)
+        ) as resp:
+            if resp.status == 200:
+                execution = await resp.json()
+                actions = execution.get("actions_executed", 0)
+                if actions > 0:
+                    print(f"Response Engine executed {actions} actions")
+            else:
+                print(f"Response Engine responded: {resp.status}")
+    except Exception as e:
+        print(f"Could not reach Response Engine: {e}")
+
+async def forward_to_gateway(alert: Alert, body: Optional[bytes] = None):
     try:
-        async with aiohttp.ClientSession() as session:
-            async with session.post(
-                f"{API_GATEWAY_URL}/internal/alert",
-                json=alert.model_dump(),
-                timeout=aiohttp.ClientTimeout(total=5)
-            ) as resp:
-                if resp.status == 200:
-                    print(f"Alert forwarded to gateway: {alert.id}")
-                else:
-                    print(f"Gateway responded: {resp.status}")
+        async with get_http_session().post(
+            f"{API_GATEWAY_URL}/internal/alert",
+            data=body if body is not None else alert.model_dump_json().encode(),
+            headers=JSON_HEADERS,
+            timeout=aiohttp.ClientTimeout(total=5)
+        ) as resp:
+            if resp.status == 200:
+                print(f"Alert forwarded to gateway: {alert.id}")
+            else:
+                print(f"Gateway responded: {resp.status}")
     except aiohttp.ClientError as e:
         print(f"Could not reach API Gateway: {e}")
 
 @app.post("/alerts/{alert_id}/acknowledge", tags=["Alerts"])
 async def acknowledge_alert(alert_id: str):
-    for alert in alert_history:
-        if alert.id == alert_id:
-            alert.acknowledged = True
-            return {"status": "acknowledged", "alert_id": alert_id}
-    raise HTTPException(status_code=404, detail="Alert not found")
+    global alerts_acknowledged, ack_latency_total
+    alert = alert_index.get(alert_id)
+    if alert is None:
+        raise HTTPException(status_code=404, detail="Alert not found")
+    if not alert.acknowledged:
+        alert.acknowledged = True
+        alerts_acknowledged += 1
+        ack_latency_total += time.time() - alert._created_at
+    return {"status": "acknowledged", "alert_id": alert_id}
 
 @app.delete("/alerts", tags=["Alerts"])
 async def clear_alerts():
-    global alert_history
-    alert_history = []
+    alert_history.clear()
+    alert_index.clear()
     return {"status": "cleared"}
 
 if __name__ == "__main__":
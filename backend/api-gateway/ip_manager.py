@@ -3,14 +3,16 @@ Threat_Ops.ai - IP Manager Module
 Centralized IP blocking, rate limiting, and threat tracking
 """
 
+import sys
 import time
 import asyncio
 import threading
-from typing import Dict, Optional, List, Set
+from typing import Deque, Dict, Optional, List, Set
 from dataclasses import dataclass, field
 from enum import Enum
 from datetime import datetime, timedelta
-from collections import defaultdict
+from collections import defaultdict, deque
+from itertools import islice
 import json
 
 
@@ -21,6 +23,12 @@ class ThreatSeverity(str, Enum):
     CRITICAL = "critical"
 
 
+def _prune_before(timestamps: Deque[float], cutoff: float) -> None:
+    """Drop timestamps at or before cutoff (oldest are always on the left)"""
+    while timestamps and timestamps[0] <= cutoff:
+        timestamps.popleft()
+
+
 class BlockReason(str, Enum):
     FLOODING = "flooding"
     SQL_INJECTION = "sql_injection"
@@ -70,7 +78,7 @@ class IPBlockRecord:
 class RateLimitRecord:
     """Rate limit tracking for an IP"""
     ip: str
-    requests: List[float] = field(default_factory=list)  # timestamps
+    requests: Deque[float] = field(default_factory=deque)  # timestamps, oldest first
     limit: int = 100  # requests per window
     window: int = 60  # window in seconds
     throttled: bool = False
@@ -78,9 +86,8 @@ class RateLimitRecord:
     def add_request(self) -> bool:
         """Add request and return True if rate exceeded"""
         now = time.time()
-        cutoff = now - self.window
         # Clean old requests
-        self.requests = [t for t in self.requests if t > cutoff]
+        _prune_before(self.requests, now - self.window)
         self.requests.append(now)
 
         if len(self.requests) > self.limit:
@@ -93,17 +100,18 @@ class RateLimitRecord:
         if not self.requests:
             return 0
         now = time.time()
-        cutoff = now - self.window
-        recent = [t for t in self.requests if t > cutoff]
-        if len(recent) < 2:
-            return len(recent)
-        elapsed = now - min(recent)
-        return len(recent) / max(elapsed, 0.1)
+        _prune_before(self.requests, now - self.window)
+        if len(self.requests) < 2:
+            return len(self.requests)
+        elapsed = now - self.requests[0]
+        return len(self.requests) / max(elapsed, 0.1)
 
 
 @dataclass
 class AuditLogEntry:
     """Audit log for IP actions"""
+    # Up to MAX_AUDIT_LOG of these live at once; slots drop the per-instance __dict__
+    __slots__ = ("timestamp", "action", "ip", "reason", "severity", "duration", "triggered_by", "details")
     timestamp: str
     action: str  # block, unblock, rate_limit, alert
     ip: str
@@ -111,12 +119,14 @@ class AuditLogEntry:
     severity: str
     duration: Optional[int]  # seconds
     triggered_by: str  # rule_id, manual, etc.
-    details: Dict = field(default_factory=dict)
+    details: Dict
 
 
 @dataclass
 class DroppedPacketRecord:
     """Record of a dropped/blocked request"""
+    # One per blocked request (MAX_DROPPED_PACKETS kept); slots drop the per-instance __dict__
+    __slots__ = ("timestamp", "source_ip", "attack_type", "reason", "endpoint", "method", "severity", "details")
     timestamp: str
     source_ip: str
     attack_type: str  # sql_injection, brute_force, flooding, blocked_ip
@@ -124,7 +134,7 @@ class DroppedPacketRecord:
     endpoint: str
     method: str
     severity: str
-    details: Dict = field(default_factory=dict)
+    details: Dict
 
     def to_dict(self) -> Dict:
         return {
@@ -143,7 +153,7 @@ class DroppedPacketRecord:
 class BruteForceTracker:
     """Track authentication attempts for an IP"""
     ip: str
-    failed_attempts: List[float] = field(default_factory=list)  # timestamps
+    failed_attempts: Deque[float] = field(default_factory=deque)  # timestamps, oldest first
     usernames_tried: Set[str] = field(default_factory=set)
     last_attempt: float = 0
 
@@ -161,8 +171,7 @@ class BruteForceTracker:
         self.last_attempt = now
 
         # Clean old attempts
-        cutoff = now - self.TIME_WINDOW
-        self.failed_attempts = [t for t in self.failed_attempts if t > cutoff]
+        _prune_before(self.failed_attempts, now - self.TIME_WINDOW)
         self.failed_attempts.append(now)
         self.usernames_tried.add(username)
 
@@ -205,7 +214,7 @@ class BruteForceTracker:
 class FloodingTracker:
     """Track request rate for flooding detection"""
     ip: str
-    request_times: List[float] = field(default_factory=list)
+    request_times: Deque[float] = field(default_factory=deque)  # oldest first
 
     # Thresholds (tunable)
     FLOOD_THRESHOLD = 50  # requests per 10 seconds
@@ -220,8 +229,7 @@ class FloodingTracker:
         now = time.time()
 
         # Clean old requests
-        cutoff = now - self.TIME_WINDOW
-        self.request_times = [t for t in self.request_times if t > cutoff]
+        _prune_before(self.request_times, now - self.TIME_WINDOW)
         self.request_times.append(now)
 
         request_count = len(self.request_times)
@@ -287,13 +295,17 @@ class IPManager:
     # Protected IPs (never block)
     PROTECTED_IPS = {"127.0.0.1", "localhost", "::1"}
 
+    # History sizes; the oldest records fall off in O(1)
+    MAX_AUDIT_LOG = 1000
+    MAX_DROPPED_PACKETS = 500
+
     def __init__(self):
         # Core state
         self._blocked_ips: Dict[str, IPBlockRecord] = {}
         self._rate_limits: Dict[str, RateLimitRecord] = defaultdict(
             lambda: RateLimitRecord(ip="", limit=100, window=60)
         )
-        self._audit_log: List[AuditLogEntry] = []
+        self._audit_log: Deque[AuditLogEntry] = deque(maxlen=self.MAX_AUDIT_LOG)
         self._threat_scores: Dict[str, float] = defaultdict(float)  # IP -> cumulative threat score
 
         # NEW: Detection trackers
@@ -301,7 +313,7 @@ class IPManager:
         self._flooding_trackers: Dict[str, FloodingTracker] = {}
 
         # NEW: Dropped packet log
-        self._dropped_packets: List[DroppedPacketRecord] = []
+        self._dropped_packets: Deque[DroppedPacketRecord] = deque(maxlen=self.MAX_DROPPED_PACKETS)
         self._dropped_count: Dict[str, int] = defaultdict(int)  # attack_type -> count
 
         # Callbacks for dropped packet events (will be set by middleware)
@@ -376,9 +388,6 @@ class IPManager:
         )
         with self._lock:
             self._audit_log.append(entry)
-            # Keep last 1000 entries
-            if len(self._audit_log) > 1000:
-                self._audit_log = self._audit_log[-1000:]
 
     # ==========================================
     # CORE API: block_ip, unblock_ip, is_blocked
@@ -804,12 +813,14 @@ class IPManager:
         details: Dict = None
     ):
         """Record a dropped/blocked packet"""
+        # Under attack the same source IP and endpoint repeat across the whole
+        # history; interning makes every record share one string object for each
         record = DroppedPacketRecord(
             timestamp=datetime.utcnow().isoformat() + "Z",
-            source_ip=source_ip,
+            source_ip=sys.intern(source_ip),
             attack_type=attack_type,
             reason=reason,
-            endpoint=endpoint,
+            endpoint=sys.intern(endpoint),
             method=method,
             severity=severity,
             details=details or {}
@@ -819,10 +830,6 @@ class IPManager:
             self._dropped_packets.append(record)
             self._dropped_count[attack_type] += 1
 
-            # Keep last 500 records
-            if len(self._dropped_packets) > 500:
-                self._dropped_packets = self._dropped_packets[-500:]
-
         # Trigger callback if set
         if self._on_packet_dropped:
             try:
@@ -892,10 +899,10 @@ class IPManager:
     def get_dropped_packets(self, limit: int = 100, attack_type: str = None) -> List[Dict]:
         """Get recent dropped packets"""
         with self._lock:
-            packets = self._dropped_packets[-limit:]
+            packets = islice(reversed(self._dropped_packets), max(limit, 0))
             if attack_type:
-                packets = [p for p in packets if p.attack_type == attack_type]
-            return [p.to_dict() for p in reversed(packets)]
+                packets = (p for p in packets if p.attack_type == attack_type)
+            return [p.to_dict() for p in packets]
 
     def get_dropped_stats(self) -> Dict:
         """Get dropped packet statistics"""
@@ -1006,7 +1013,7 @@ class IPManager:
     def get_audit_log(self, limit: int = 100) -> List[Dict]:
         """Get recent audit log entries"""
         with self._lock:
-            entries = self._audit_log[-limit:]
+            entries = islice(reversed(self._audit_log), max(limit, 0))
             return [
                 {
                     "timestamp": e.timestamp,
@@ -1018,7 +1025,7 @@ class IPManager:
                     "triggered_by": e.triggered_by,
                     "details": e.details
                 }
-                for e in reversed(entries)
+                for e in entries
             ]
 
     def get_stats(self) -> Dict:
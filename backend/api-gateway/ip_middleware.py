@@ -17,6 +17,7 @@ from ip_manager import ip_manager, BlockReason, ThreatSeverity
 # Global reference to Socket.IO for emitting events
 _sio = None
 _event_queue = []
+_event_ready: Optional[asyncio.Event] = None  # set while _event_queue has events; created in run_event_queue
 
 
 def set_socket_io(sio):
@@ -36,19 +37,46 @@ def queue_dropped_event(data: Dict[str, Any]):
     """Queue dropped packet event for async emission"""
     global _event_queue
     _event_queue.append(data)
+    if _event_ready is not None:
+        _event_ready.set()
+
+
+EMIT_BATCH_SIZE = 50
+
+
+async def emit_in_batches(sio, event_name: str, items, batch_size: int = EMIT_BATCH_SIZE):
+    """
+    Emit each item, yielding to the event loop after every batch_size emits.
+    Socket.IO emits only enqueue, so a long burst would otherwise starve HTTP handlers.
+    """
+    for i, item in enumerate(items, 1):
+        try:
+            await sio.emit(event_name, item)
+        except Exception as e:
+            print(f"[Middleware] Failed to emit event: {e}")
+        if i % batch_size == 0:
+            await asyncio.sleep(0)
 
 
 async def process_event_queue():
-    """Process queued events (call periodically)"""
+    """Emit and clear all queued events"""
     global _event_queue, _sio
     if _sio and _event_queue:
         events = _event_queue.copy()
         _event_queue.clear()
-        for event in events:
-            try:
-                await _sio.emit('ip:dropped', event)
-            except Exception as e:
-                print(f"[Middleware] Failed to emit event: {e}")
+        await emit_in_batches(_sio, 'ip:dropped', events)
+
+
+async def run_event_queue():
+    """Emit queued events as soon as they arrive (runs for the app's lifetime)"""
+    global _event_ready
+    _event_ready = asyncio.Event()  # created here so it binds to the running loop
+    if _event_queue:
+        _event_ready.set()  # events queued before startup
+    while True:
+        await _event_ready.wait()
+        _event_ready.clear()
+        await process_event_queue()
 
 
 class IPBlockingMiddleware(BaseHTTPMiddleware):
@@ -65,7 +93,7 @@ class IPBlockingMiddleware(BaseHTTPMiddleware):
     """
 
     # Endpoints that bypass blocking (health checks, etc.)
-    BYPASS_PATHS = {"/health", "/docs", "/openapi.json", "/redoc", "/ip/dropped", "/ip/stats"}
+    BYPASS_PATHS = frozenset({"/health", "/docs", "/openapi.json", "/redoc", "/ip/dropped", "/ip/stats"})
 
     # Endpoint rate limit categories
     RATE_LIMIT_CATEGORIES = {
@@ -297,10 +325,12 @@ class BruteForceDetectionMiddleware(BaseHTTPMiddleware):
     Should be placed after IPBlockingMiddleware.
     """
 
-    AUTH_ENDPOINTS = {"/login", "/auth", "/auth/login", "/api/auth", "/api/login"}
+    AUTH_ENDPOINTS = frozenset({"/login", "/auth", "/auth/login", "/api/auth", "/api/login"})
 
     def __init__(self, app: ASGIApp):
         super().__init__(app)
+        # str.startswith takes a tuple, so every prefix is checked in one C call
+        self._auth_prefixes = tuple(self.AUTH_ENDPOINTS)
 
     async def dispatch(self, request: Request, call_next: Callable) -> Response:
         """Detect brute force on auth endpoints"""
@@ -308,7 +338,7 @@ class BruteForceDetectionMiddleware(BaseHTTPMiddleware):
         method = request.method
 
         # Only check POST to auth endpoints
-        if method != "POST" or not any(path.startswith(ep) for ep in self.AUTH_ENDPOINTS):
+        if method != "POST" or not path.startswith(self._auth_prefixes):
             return await call_next(request)
 
         client_ip = getattr(request.state, 'client_ip', None)
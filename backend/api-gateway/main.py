@@ -1,17 +1,21 @@
 import os
+import time
 import asyncio
 from datetime import datetime
 from contextlib import asynccontextmanager
-from typing import Dict, Set, Optional, List
+from typing import Dict, Set, Optional, List, Tuple
 
 from fastapi import FastAPI, HTTPException, Request
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import ORJSONResponse
 from pydantic import BaseModel
 import socketio
+import aiohttp
+import orjson
 
 # IP Management imports
 from ip_manager import ip_manager, BlockReason, ThreatSeverity
-from ip_middleware import setup_ip_middleware, process_event_queue, set_socket_io
+from ip_middleware import setup_ip_middleware, run_event_queue, set_socket_io, emit_in_batches
 
 PORT = int(os.environ.get("PORT", 3001))
 INGEST_SERVICE_URL = os.environ.get("INGEST_SERVICE_URL", "http://localhost:8001")
@@ -90,13 +94,8 @@ async def lifespan(app: FastAPI):
     # Start IP Manager background tasks
     await ip_manager.start()
 
-    # Start event queue processor
-    async def event_processor():
-        while True:
-            await process_event_queue()
-            await asyncio.sleep(0.1)  # Process every 100ms
-
-    event_task = asyncio.create_task(event_processor())
+    # Start event queue processor (wakes when middleware queues an event)
+    event_task = asyncio.create_task(run_event_queue())
 
     print(f"API Gateway running on port {PORT}")
     print(f"Ingest URL: {INGEST_SERVICE_URL}")
@@ -113,13 +112,16 @@ async def lifespan(app: FastAPI):
 
     # Stop IP Manager
     await ip_manager.stop()
+    if http_session is not None:
+        await http_session.close()
     print("API Gateway shutting down...")
 
 app = FastAPI(
     title="Threat_Ops.ai - API Gateway",
     description="Socket.IO bridge",
     version="1.0.0",
-    lifespan=lifespan
+    lifespan=lifespan,
+    default_response_class=ORJSONResponse
 )
 
 app.add_middleware(
@@ -154,24 +156,25 @@ async def get_connected_clients():
         "client_ids": list(connected_clients)
     }
 
+def to_frontend_event(event: TelemetryEvent) -> dict:
+    return {
+        "deviceId": event.service,
+        "deviceName": event.service.replace("-", " ").title(),
+        "timestamp": event.received_at or datetime.utcnow().isoformat() + "Z",
+        "metrics": {
+            "cpu": event.payload.get("cpu", 50),
+            "memory": event.payload.get("memory", 50),
+            "network": event.payload.get("network", 100),
+            "requests": event.payload.get("requests", 100),
+            "devices": event.payload.get("devices", {}),
+            "sector": event.payload.get("sector", "unknown"),
+        }
+    }
+
 @app.post("/internal/telemetry", tags=["Internal"])
 async def receive_telemetry(event: TelemetryEvent):
     try:
-        frontend_event = {
-            "deviceId": event.service,
-            "deviceName": event.service.replace("-", " ").title(),
-            "timestamp": event.received_at or datetime.utcnow().isoformat() + "Z",
-            "metrics": {
-                "cpu": event.payload.get("cpu", 50),
-                "memory": event.payload.get("memory", 50),
-                "network": event.payload.get("network", 100),
-                "requests": event.payload.get("requests", 100),
-                "devices": event.payload.get("devices", {}),
-                "sector": event.payload.get("sector", "unknown"),
-            }
-        }
-
-        await sio.emit('telemetry', frontend_event)
+        await sio.emit('telemetry', to_frontend_event(event))
 
         return {"status": "broadcast", "clients": len(connected_clients)}
 
@@ -179,6 +182,18 @@ async def receive_telemetry(event: TelemetryEvent):
         print(f"Telemetry broadcast error: {e}")
         raise HTTPException(status_code=500, detail=str(e))
 
+@app.post("/internal/telemetry/batch", tags=["Internal"])
+async def receive_telemetry_batch(events: List[TelemetryEvent]):
+    try:
+        # Frontend events are built lazily, one per emit, so only one is alive at a time
+        await emit_in_batches(sio, 'telemetry', (to_frontend_event(event) for event in events))
+
+        return {"status": "broadcast", "events": len(events), "clients": len(connected_clients)}
+
+    except Exception as e:
+        print(f"Telemetry broadcast error: {e}")
+        raise HTTPException(status_code=500, detail=str(e))
+
 @app.post("/internal/alert", tags=["Internal"])
 async def receive_alert(alert: AlertEvent):
     try:
@@ -476,20 +491,95 @@ async def detect_threat_endpoint(request: Request, data: dict):
 # ==========================================
 # FLEET MANAGEMENT (Multi-Laptop)
 # ==========================================
-import aiohttp
+
+# The node registry is re-read on every /attack and dashboard /nodes poll;
+# serve it from a short-lived cache instead
+UPSTREAM_CACHE_TTL = 2.0  # seconds
+_upstream_cache: Dict[str, tuple] = {}  # url -> (fetched_at, json)
+_upstream_inflight: Dict[str, asyncio.Future] = {}  # url -> fetch shared by concurrent misses
+
+# Keep-alive connections to the ingest service and response engine
+http_session: Optional[aiohttp.ClientSession] = None
+
+def get_http_session() -> aiohttp.ClientSession:
+    global http_session
+    if http_session is None or http_session.closed:
+        http_session = aiohttp.ClientSession(connector=aiohttp.TCPConnector(limit=16, keepalive_timeout=60))
+    return http_session
+
+async def fetch_json(url: str) -> Tuple[int, Optional[dict]]:
+    """GET a JSON document and cache it on success. Returns (status, json), json None on non-200."""
+    fetched_at = time.monotonic()
+    async with get_http_session().get(url) as resp:
+        if resp.status != 200:
+            return resp.status, None
+        data = await resp.json()
+
+    _upstream_cache[url] = (fetched_at, data)
+    return 200, data
+
+async def get_cached_json(url: str) -> Tuple[int, Optional[dict]]:
+    """GET a JSON document, reusing a copy younger than UPSTREAM_CACHE_TTL. Returns (status, json)."""
+    cached = _upstream_cache.get(url)
+    if cached and time.monotonic() - cached[0] < UPSTREAM_CACHE_TTL:
+        return 200, cached[1]
+
+    # Concurrent misses on the same URL all wait on one upstream request
+    fetch = _upstream_inflight.get(url)
+    if fetch is None:
+        fetch = asyncio.ensure_future(fetch_json(url))
+        _upstream_inflight[url] = fetch
+        fetch.add_done_callback(lambda _: _upstream_inflight.pop(url, None))
+    # Shielded so one cancelled caller can't abort the fetch the others share
+    return await asyncio.shield(fetch)
 
 @app.get("/nodes", tags=["Fleet"])
 async def get_nodes():
     """Proxy to Ingest Service /nodes"""
     try:
-        async with aiohttp.ClientSession() as session:
-            async with session.get(f"{INGEST_SERVICE_URL}/nodes") as resp:
-                if resp.status == 200:
-                    return await resp.json()
-                raise HTTPException(status_code=resp.status, detail="Failed to fetch nodes")
+        status, nodes_data = await get_cached_json(f"{INGEST_SERVICE_URL}/nodes")
+        if nodes_data is None:
+            raise HTTPException(status_code=status, detail="Failed to fetch nodes")
+        return nodes_data
     except aiohttp.ClientError as e:
         raise HTTPException(status_code=503, detail=f"Ingest Service unavailable: {e}")
 
+JSON_HEADERS = {"Content-Type": "application/json"}
+
+async def deliver_attack(session: aiohttp.ClientSession, node: dict, body: bytes, attacker_ip: str) -> dict:
+    """Forward a pre-encoded attack body to a single node. Never raises, so one dead node can't fail the fan-out."""
+    node_url = f"http://{node['ip']}:{node['port']}/receive-attack"
+    try:
+        async with session.post(
+            node_url,
+            data=body,
+            headers=JSON_HEADERS,
+            timeout=aiohttp.ClientTimeout(total=5)
+        ) as resp:
+            result = await resp.json()
+
+            # Handle blocked response
+            if resp.status == 403:
+                result["blocked"] = True
+                await sio.emit('attack_blocked', {
+                    "attacker_ip": attacker_ip,
+                    "node_id": node['node_id'],
+                    "message": result.get("message", "Attack blocked!")
+                })
+            return {
+                "node_id": node["node_id"],
+                "ip": node["ip"],
+                "status": "delivered" if resp.status == 200 else "failed",
+                "response": result
+            }
+    except Exception as e:
+        return {
+            "node_id": node["node_id"],
+            "ip": node["ip"],
+            "status": "unreachable",
+            "error": str(e)
+        }
+
 @app.post("/attack", tags=["Fleet"])
 async def route_attack(data: dict, request: Request):
     """Route an attack to the correct sector node(s)"""
@@ -509,34 +599,32 @@ async def route_attack(data: dict, request: Request):
 
     # 0. Check if this attacker IP is already blocked
     try:
-        async with aiohttp.ClientSession() as session:
-            async with session.get(f"{RESPONSE_ENGINE_URL}/status") as resp:
-                if resp.status == 200:
-                    status_data = await resp.json()
-                    blocked_ips = status_data.get("blocked_ips", [])
-                    if attacker_ip in blocked_ips:
-                        await sio.emit('attack_blocked', {
-                            "attacker_ip": attacker_ip,
-                            "sector": sector,
-                            "attack_type": attack_type,
-                            "message": f"🛡️ Attack BLOCKED! IP {attacker_ip} is on blocked list."
-                        })
-                        return {
-                            "success": False,
-                            "blocked": True,
-                            "attacker_ip": attacker_ip,
-                            "message": f"Attack blocked! IP {attacker_ip} is blocked."
-                        }
+        # Always read live: a block must take effect on the very next attack
+        async with get_http_session().get(f"{RESPONSE_ENGINE_URL}/status") as resp:
+            if resp.status == 200:
+                status_data = await resp.json()
+                blocked_ips = status_data.get("blocked_ips", [])
+                if attacker_ip in blocked_ips:
+                    await sio.emit('attack_blocked', {
+                        "attacker_ip": attacker_ip,
+                        "sector": sector,
+                        "attack_type": attack_type,
+                        "message": f"🛡️ Attack BLOCKED! IP {attacker_ip} is on blocked list."
+                    })
+                    return {
+                        "success": False,
+                        "blocked": True,
+                        "attacker_ip": attacker_ip,
+                        "message": f"Attack blocked! IP {attacker_ip} is blocked."
+                    }
     except:
         pass  # Continue if Response Engine is unavailable
 
     # 1. Get matching nodes from Ingest Service
     try:
-        async with aiohttp.ClientSession() as session:
-            async with session.get(f"{INGEST_SERVICE_URL}/nodes") as resp:
-                if resp.status != 200:
-                    raise HTTPException(status_code=503, detail="Cannot reach node registry")
-                nodes_data = await resp.json()
+        _, nodes_data = await get_cached_json(f"{INGEST_SERVICE_URL}/nodes")
+        if nodes_data is None:
+            raise HTTPException(status_code=503, detail="Cannot reach node registry")
     except aiohttp.ClientError as e:
         raise HTTPException(status_code=503, detail=f"Registry unavailable: {e}")
 
@@ -553,45 +641,19 @@ async def route_attack(data: dict, request: Request):
             "available_sectors": nodes_data.get("sectors", {})
         }
 
-    # 3. Forward attack to all matching nodes (with attacker_ip)
-    results = []
-    for node in matching_nodes:
-        node_url = f"http://{node['ip']}:{node['port']}/receive-attack"
-        try:
-            async with aiohttp.ClientSession() as session:
-                async with session.post(
-                    node_url,
-                    json={
-                        "attack_type": attack_type,
-                        "payload": payload,
-                        "from_gateway": True,
-                        "attacker_ip": attacker_ip  # Pass attacker IP for blocking check
-                    },
-                    timeout=aiohttp.ClientTimeout(total=5)
-                ) as resp:
-                    result = await resp.json()
-
-                    # Handle blocked response
-                    if resp.status == 403:
-                        result["blocked"] = True
-                        await sio.emit('attack_blocked', {
-                            "attacker_ip": attacker_ip,
-                            "node_id": node['node_id'],
-                            "message": result.get("message", "Attack blocked!")
-                        })
-                    results.append({
-                        "node_id": node["node_id"],
-                        "ip": node["ip"],
-                        "status": "delivered" if resp.status == 200 else "failed",
-                        "response": result
-                    })
-        except Exception as e:
-            results.append({
-                "node_id": node["node_id"],
-                "ip": node["ip"],
-                "status": "unreachable",
-                "error": str(e)
-            })
+    # 3. Forward attack to all matching nodes concurrently (with attacker_ip).
+    # Every node gets the same body, so encode it once for the whole fan-out
+    body = orjson.dumps({
+        "attack_type": attack_type,
+        "payload": payload,
+        "from_gateway": True,
+        "attacker_ip": attacker_ip  # Pass attacker IP for blocking check
+    })
+    async with aiohttp.ClientSession() as session:
+        results = await asyncio.gather(*[
+            deliver_attack(session, node, body, attacker_ip)
+            for node in matching_nodes
+        ])
 
     # Broadcast attack event to dashboard
     await sio.emit('attack_routed', {
@@ -1,20 +1,30 @@
 import os
 import uuid
+import asyncio
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime
 from contextlib import asynccontextmanager
 from typing import List
 
-from fastapi import FastAPI, HTTPException
+from fastapi import FastAPI, HTTPException, Request
 from fastapi.middleware.cors import CORSMiddleware
-from pydantic import BaseModel
+from pydantic import BaseModel, TypeAdapter, ValidationError
 import aiohttp
 
-from rules import run_all_rules, AnomalySignal
+from rules import run_all_rules, AnomalySignal, DETECTION_RULES
 
 PORT = int(os.environ.get("PORT", 8002))
 ALERT_MANAGER_URL = os.environ.get("ALERT_MANAGER_URL", "http://localhost:8003")
 MODEL_SERVICE_URL = os.environ.get("MODEL_SERVICE_URL", "http://localhost:8006")
 
+ML_BATCH_TIMEOUT = float(os.environ.get("ML_BATCH_TIMEOUT", 10))  # seconds for one whole batch
+
+JSON_HEADERS = {"Content-Type": "application/json"}
+
+# Rules run off the event loop. A single worker keeps the stateful
+# rate/brute-force trackers in rules.py free of races.
+rules_executor: ThreadPoolExecutor = None
+
 class TelemetryEvent(BaseModel):
     event_id: str
     source_ip: str
@@ -25,6 +35,9 @@ class TelemetryEvent(BaseModel):
     timestamp: int
     received_at: str = None
 
+# Built once at import; /analyze/batch parses and validates the raw body in one pass
+_batch_adapter = TypeAdapter(List[TelemetryEvent])
+
 class AnomalyOutput(BaseModel):
     anomaly_id: str
     rule_id: str
@@ -37,6 +50,9 @@ class AnomalyOutput(BaseModel):
     source_event_id: str
     detected_at: str
 
+# Serializes a whole anomaly list straight to JSON bytes (no intermediate dicts)
+_anomalies_adapter = TypeAdapter(List[AnomalyOutput])
+
 class HealthResponse(BaseModel):
     status: str = "healthy"
     service: str = "detection-engine"
@@ -49,14 +65,19 @@ class AnalyzeResponse(BaseModel):
     anomalies_detected: int
     anomalies: List[AnomalyOutput]
 
+def run_rules_batch(event_dicts: List[dict]) -> List[List[AnomalySignal]]:
+    return [run_all_rules(event_dict) for event_dict in event_dicts]
+
 @asynccontextmanager
 async def lifespan(app: FastAPI):
-    from rules import DETECTION_RULES
+    global rules_executor
+    rules_executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="rules")
     print(f"Detection Engine running on port {PORT}")
     print(f"Rules loaded: {len(DETECTION_RULES)}")
     print(f"Alert Manager URL: {ALERT_MANAGER_URL}")
     print(f"Model Service URL: {MODEL_SERVICE_URL}")
     yield
+    rules_executor.shutdown(wait=False)
     print("Detection Engine shutting down...")
 
 app = FastAPI(
@@ -74,27 +95,30 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+# Nothing in these responses changes at runtime, so both are built once
+HEALTH = HealthResponse(
+    status="healthy",
+    service="detection-engine",
+    version="1.0.0",
+    rules_loaded=len(DETECTION_RULES),
+    ml_enabled=True
+)
+
+RULES_LISTING = {
+    "rules": [
+        {"id": rule_id, "name": rule_func.__name__}
+        for rule_id, rule_func in DETECTION_RULES
+    ],
+    "count": len(DETECTION_RULES)
+}
+
 @app.get("/health", response_model=HealthResponse, tags=["Health"])
 async def health_check():
-    from rules import DETECTION_RULES
-    return HealthResponse(
-        status="healthy",
-        service="detection-engine",
-        version="1.0.0",
-        rules_loaded=len(DETECTION_RULES),
-        ml_enabled=True
-    )
+    return HEALTH
 
 @app.get("/rules", tags=["Rules"])
 async def list_rules():
-    from rules import DETECTION_RULES
-    return {
-        "rules": [
-            {"id": rule_id, "name": rule_func.__name__}
-            for rule_id, rule_func in DETECTION_RULES
-        ],
-        "count": len(DETECTION_RULES)
-    }
+    return RULES_LISTING
 
 @app.post("/analyze", response_model=AnalyzeResponse, tags=["Detection"])
 async def analyze_event(event: TelemetryEvent):
@@ -102,9 +126,11 @@ async def analyze_event(event: TelemetryEvent):
         event_dict = event.model_dump()
 
         # Layer 1: Rule-based detection
-        anomaly_signals = run_all_rules(event_dict)
+        loop = asyncio.get_running_loop()
+        anomaly_signals = await loop.run_in_executor(rules_executor, run_all_rules, event_dict)
 
         anomalies = []
+        detected_at = datetime.utcnow().isoformat() + "Z"
         for signal in anomaly_signals:
             anomaly_id = str(uuid.uuid4())
 
@@ -118,7 +144,7 @@ async def analyze_event(event: TelemetryEvent):
                 evidence=signal.evidence,
                 recommendation=signal.recommendation,
                 source_event_id=event.event_id,
-                detected_at=datetime.utcnow().isoformat() + "Z"
+                detected_at=detected_at
             )
             anomalies.append(anomaly)
             print(f"[RULES] Anomaly detected: {signal.rule_name} ({signal.severity})")
@@ -142,100 +168,152 @@ async def analyze_event(event: TelemetryEvent):
         print(f"Analysis error: {e}")
         raise HTTPException(status_code=500, detail=str(e))
 
-async def call_ml_service(event_dict: dict) -> List[AnomalyOutput]:
-    """Call the Model Microservice for AI-powered detection (Layer 2)"""
-    ml_anomalies = []
-
+def build_ml_request(event_dict: dict) -> dict:
+    """Build the Model Microservice request for one event - include all relevant data for each brain"""
     payload = event_dict.get("payload", {})
     domain = payload.get("domain", event_dict.get("domain", "general"))
 
-    try:
-        # Build request for ML service - include all relevant data for each brain
-        # For Auth attempts, use username as payload for SQLi/Pattern detection
-        text_payload = payload.get("query") or payload.get("username") or ""
-
-        ml_request = {
-            "sector": domain,
-            "payload": text_payload,
-            "sensor_data": payload.get("sensor_data", []),
-            "network_data": {
-                "Rate": payload.get("requests", 0) * 100,
-                "syn_count": payload.get("syn_count", payload.get("network", 0)),
-                "rst_count": 0,
-                "IAT": 500,
-                "Number": payload.get("requests", 5)
-            }
+    # For Auth attempts, use username as payload for SQLi/Pattern detection
+    text_payload = payload.get("query") or payload.get("username") or ""
+
+    return {
+        "sector": domain,
+        "payload": text_payload,
+        "sensor_data": payload.get("sensor_data", []),
+        "network_data": {
+            "Rate": payload.get("requests", 0) * 100,
+            "syn_count": payload.get("syn_count", payload.get("network", 0)),
+            "rst_count": 0,
+            "IAT": 500,
+            "Number": payload.get("requests", 5)
         }
+    }
 
+def ml_anomalies_from_result(event_dict: dict, result: dict) -> List[AnomalyOutput]:
+    """Turn one Model Microservice verdict into anomalies if ML flagged it as a threat"""
+    if result.get("status") == "blocked" or result.get("threat_level") in ["high", "critical"]:
+        return [AnomalyOutput(
+            anomaly_id=str(uuid.uuid4()),
+            rule_id="ml_" + result.get("source", "network_shield").lower().replace(" ", "_"),
+            rule_name=f"🧠 ML: {result.get('source', 'AI Detection')}",
+            severity=result.get("threat_level", "high"),
+            confidence=result.get("score", 0.85),
+            description=result.get("message", "AI model detected anomalous behavior"),
+            evidence={"ml_response": result},
+            recommendation="Review ML detection details",
+            source_event_id=event_dict.get("event_id", ""),
+            detected_at=datetime.utcnow().isoformat() + "Z"
+        )]
+    return []
+
+async def call_ml_service(event_dict: dict) -> List[AnomalyOutput]:
+    """Call the Model Microservice for AI-powered detection (Layer 2)"""
+    try:
         async with aiohttp.ClientSession() as session:
             async with session.post(
                 f"{MODEL_SERVICE_URL}/api/analyze",
-                json=ml_request,
+                json=build_ml_request(event_dict),
                 timeout=aiohttp.ClientTimeout(total=2)
             ) as resp:
                 if resp.status == 200:
-                    result = await resp.json()
-
-                    # Check if ML flagged this as a threat
-                    if result.get("status") == "blocked" or result.get("threat_level") in ["high", "critical"]:
-                        ml_anomalies.append(AnomalyOutput(
-                            anomaly_id=str(uuid.uuid4()),
-                            rule_id="ml_" + result.get("source", "network_shield").lower().replace(" ", "_"),
-                            rule_name=f"🧠 ML: {result.get('source', 'AI Detection')}",
-                            severity=result.get("threat_level", "high"),
-                            confidence=result.get("score", 0.85),
-                            description=result.get("message", "AI model detected anomalous behavior"),
-                            evidence={"ml_response": result},
-                            recommendation="Review ML detection details",
-                            source_event_id=event_dict.get("event_id", ""),
-                            detected_at=datetime.utcnow().isoformat() + "Z"
-                        ))
+                    return ml_anomalies_from_result(event_dict, await resp.json())
     except Exception as e:
         # ML service unavailable - fail silently, rules still work
         print(f"⚠️ [ML INFO] Call to Model Service failed: {e}")
-        pass
 
-    return ml_anomalies
+    return []
+
+async def call_ml_service_batch(event_dicts: List[dict]) -> List[List[AnomalyOutput]]:
+    """Score a whole batch with one ordered call to the Model Microservice batch endpoint.
+
+    Requests keep event order so the sequence brains' rolling windows see readings in order.
+    """
+    ml_per_event = [[] for _ in event_dicts]
+    try:
+        async with aiohttp.ClientSession() as session:
+            async with session.post(
+                f"{MODEL_SERVICE_URL}/api/analyze/batch",
+                json=[build_ml_request(event_dict) for event_dict in event_dicts],
+                timeout=aiohttp.ClientTimeout(total=ML_BATCH_TIMEOUT)
+            ) as resp:
+                if resp.status == 200:
+                    results = (await resp.json()).get("results", [])
+                    for i, (event_dict, result) in enumerate(zip(event_dicts, results)):
+                        ml_per_event[i] = ml_anomalies_from_result(event_dict, result)
+                else:
+                    print(f"⚠️ [ML INFO] Model Service batch responded: {resp.status}")
+    except Exception as e:
+        # ML service unavailable - fail silently, rules still work
+        print(f"⚠️ [ML INFO] Batch call to Model Service failed for {len(event_dicts)} events: {e}")
+
+    return ml_per_event
 
 async def forward_to_alert_manager(anomalies: List[AnomalyOutput]):
     try:
         async with aiohttp.ClientSession() as session:
-            for anomaly in anomalies:
-                async with session.post(
-                    f"{ALERT_MANAGER_URL}/internal/anomaly",
-                    json=anomaly.model_dump(),
-                    timeout=aiohttp.ClientTimeout(total=5)
-                ) as resp:
-                    if resp.status == 200:
-                        print(f"Forwarded anomaly to alert manager: {anomaly.anomaly_id}")
-                    else:
-                        print(f"Alert manager responded: {resp.status}")
-    except aiohttp.ClientError as e:
+            async with session.post(
+                f"{ALERT_MANAGER_URL}/internal/anomalies",
+                data=_anomalies_adapter.dump_json(anomalies),
+                headers=JSON_HEADERS,
+                timeout=aiohttp.ClientTimeout(total=5)
+            ) as resp:
+                if resp.status == 200:
+                    print(f"Forwarded {len(anomalies)} anomalies to alert manager")
+                else:
+                    print(f"Alert manager responded: {resp.status}")
+    except (aiohttp.ClientError, asyncio.TimeoutError) as e:
         print(f"Could not reach alert manager: {e}")
 
 @app.post("/analyze/batch", tags=["Detection"])
-async def analyze_batch(events: List[TelemetryEvent]):
-    results = []
-    total_anomalies = 0
+async def analyze_batch(request: Request):
+    try:
+        events = _batch_adapter.validate_json(await request.body())
+    except ValidationError as e:
+        raise HTTPException(status_code=422, detail=e.errors(include_url=False, include_input=False))
 
-    for event in events:
-        event_dict = event.model_dump()
-        anomaly_signals = run_all_rules(event_dict)
+    event_dicts = [event.model_dump() for event in events]
 
+    # Rules (worker thread) and ML calls (event loop) overlap
+    loop = asyncio.get_running_loop()
+    signals_per_event, ml_per_event = await asyncio.gather(
+        loop.run_in_executor(rules_executor, run_rules_batch, event_dicts),
+        call_ml_service_batch(event_dicts)
+    )
+
+    anomalies = []
+    detected_at = datetime.utcnow().isoformat() + "Z"
+    for event, anomaly_signals, ml_anomalies in zip(events, signals_per_event, ml_per_event):
         for signal in anomaly_signals:
-            anomaly_id = str(uuid.uuid4())
-            results.append({
-                "event_id": event.event_id,
-                "anomaly_id": anomaly_id,
-                "rule_id": signal.rule_id,
-                "severity": signal.severity,
-            })
-            total_anomalies += 1
+            anomalies.append(AnomalyOutput(
+                anomaly_id=str(uuid.uuid4()),
+                rule_id=signal.rule_id,
+                rule_name=signal.rule_name,
+                severity=signal.severity,
+                confidence=signal.confidence,
+                description=signal.description,
+                evidence=signal.evidence,
+                recommendation=signal.recommendation,
+                source_event_id=event.event_id,
+                detected_at=detected_at
+            ))
+        anomalies.extend(ml_anomalies)
+
+    # One post to the alert manager for the whole batch
+    if anomalies:
+        await forward_to_alert_manager(anomalies)
 
     return {
         "events_analyzed": len(events),
-        "anomalies_detected": total_anomalies,
-        "anomalies": results
+        "anomalies_detected": len(anomalies),
+        "anomalies": [
+            {
+                "event_id": anomaly.source_event_id,
+                "anomaly_id": anomaly.anomaly_id,
+                "rule_id": anomaly.rule_id,
+                "severity": anomaly.severity,
+            }
+            for anomaly in anomalies
+        ]
     }
 
 if __name__ == "__main__":
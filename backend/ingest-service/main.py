@@ -1,19 +1,47 @@
 import os
 import uuid
 import time
+import asyncio
 from datetime import datetime
 from contextlib import asynccontextmanager
 
 from fastapi import FastAPI, HTTPException
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import ORJSONResponse
 import socketio
 import aiohttp
+import orjson
 
 from schemas import TelemetryEventInput, TelemetryEvent, IngestResponse, HealthResponse
-from storage import init_storage, store_event, get_events, get_event_count, clear_events
+from storage import (
+    init_storage, store_event, get_events, get_event_count, clear_events,
+    flush_events, pending_count, FLUSH_BATCH_SIZE
+)
 
 DETECTION_ENGINE_URL = os.environ.get("DETECTION_ENGINE_URL", "http://localhost:8002")
 API_GATEWAY_URL = os.environ.get("API_GATEWAY_URL", "http://localhost:3001")
+STORAGE_FLUSH_INTERVAL = 0.5  # seconds; coalesces bursts into one file write
+
+JSON_HEADERS = {"Content-Type": "application/json"}
+
+# Telemetry bound for the API Gateway is queued and forwarded in batches
+GATEWAY_BATCH_SIZE = 100
+GATEWAY_FLUSH_INTERVAL = 0.1  # seconds
+GATEWAY_QUEUE_MAX = 10_000
+gateway_queue: asyncio.Queue = None
+
+# Events bound for the Detection Engine are batched the same way (one /analyze/batch per flush)
+DETECTION_BATCH_SIZE = 100
+DETECTION_FLUSH_INTERVAL = 0.1  # seconds
+DETECTION_QUEUE_MAX = 10_000
+# Detection waits up to ML_BATCH_TIMEOUT on the model service, then up to 5s on
+# the alert manager; allow that whole chain plus headroom before giving up
+ML_BATCH_TIMEOUT = float(os.environ.get("ML_BATCH_TIMEOUT", 10))
+DETECTION_TIMEOUT = ML_BATCH_TIMEOUT + 5 + 5  # seconds
+detection_queue: asyncio.Queue = None
+
+# Set when the write buffer reaches FLUSH_BATCH_SIZE so the flusher doesn't wait for the timer
+flush_wakeup: asyncio.Event = None
 
 sio = socketio.AsyncServer(
     async_mode='asgi',
@@ -22,20 +50,116 @@ sio = socketio.AsyncServer(
     engineio_logger=False
 )
 
+async def storage_flush_loop():
+    """Write buffered events to disk once per interval, or sooner when a batch fills up"""
+    while True:
+        try:
+            await asyncio.wait_for(flush_wakeup.wait(), timeout=STORAGE_FLUSH_INTERVAL)
+        except asyncio.TimeoutError:
+            pass
+        flush_wakeup.clear()
+        if pending_count():
+            await asyncio.to_thread(flush_events)
+
+async def next_batch(queue: asyncio.Queue, batch_size: int, flush_interval: float) -> list:
+    """Wait for one item, then collect more until batch_size items or flush_interval elapses"""
+    loop = asyncio.get_running_loop()
+    batch = [await queue.get()]
+    deadline = loop.time() + flush_interval
+    while len(batch) < batch_size:
+        remaining = deadline - loop.time()
+        if remaining <= 0:
+            break
+        try:
+            batch.append(await asyncio.wait_for(queue.get(), timeout=remaining))
+        except asyncio.TimeoutError:
+            break
+    return batch
+
+async def gateway_flush_loop():
+    """Forward queued telemetry to the API Gateway, up to GATEWAY_BATCH_SIZE events per request"""
+    async with aiohttp.ClientSession() as session:
+        while True:
+            batch = await next_batch(gateway_queue, GATEWAY_BATCH_SIZE, GATEWAY_FLUSH_INTERVAL)
+            try:
+                async with session.post(
+                    f"{API_GATEWAY_URL}/internal/telemetry/batch",
+                    data=orjson.dumps(batch),
+                    headers=JSON_HEADERS,
+                    timeout=aiohttp.ClientTimeout(total=5)
+                ) as resp:
+                    if resp.status != 200:
+                        print(f"API Gateway responded: {resp.status}")
+            except Exception as e:
+                print(f"Could not reach API Gateway: {e}")
+
+async def detection_flush_loop():
+    """Forward queued events to the Detection Engine, up to DETECTION_BATCH_SIZE events per request"""
+    async with aiohttp.ClientSession() as session:
+        while True:
+            batch = await next_batch(detection_queue, DETECTION_BATCH_SIZE, DETECTION_FLUSH_INTERVAL)
+            try:
+                async with session.post(
+                    f"{DETECTION_ENGINE_URL}/analyze/batch",
+                    data=orjson.dumps(batch),
+                    headers=JSON_HEADERS,
+                    timeout=aiohttp.ClientTimeout(total=DETECTION_TIMEOUT)
+                ) as resp:
+                    if resp.status == 200:
+                        analysis = await resp.json()
+                        anomalies = analysis.get("anomalies_detected", 0)
+                        if anomalies > 0:
+                            print(f"Detection Engine found {anomalies} anomalies in {len(batch)} events")
+                    else:
+                        print(f"Detection Engine responded: {resp.status}")
+            except Exception as e:
+                print(f"Could not reach Detection Engine: {e}")
+
+def without_fleet_snapshot(event_dict: dict) -> dict:
+    """
+    The event minus payload.devices, the full fleet status each node attaches to
+    every heartbeat. Only the live dashboard feed reads it, so storage and the
+    Detection Engine get this slimmer copy (the original dict is left untouched).
+    """
+    payload = event_dict.get("payload")
+    if not payload or "devices" not in payload:
+        return event_dict
+    slim_payload = {k: v for k, v in payload.items() if k != "devices"}
+    return {**event_dict, "payload": slim_payload}
+
+def request_flush():
+    if pending_count() >= FLUSH_BATCH_SIZE:
+        flush_wakeup.set()
+
 @asynccontextmanager
 async def lifespan(app: FastAPI):
+    global flush_wakeup, gateway_queue, detection_queue
     print("Ingest Service starting...")
     init_storage()
     print(f"Storage initialized. Events in storage: {get_event_count()}")
     print(f"Forwarding to Detection Engine at: {DETECTION_ENGINE_URL}")
+    flush_wakeup = asyncio.Event()
+    flush_task = asyncio.create_task(storage_flush_loop())
+    gateway_queue = asyncio.Queue(maxsize=GATEWAY_QUEUE_MAX)
+    gateway_task = asyncio.create_task(gateway_flush_loop())
+    detection_queue = asyncio.Queue(maxsize=DETECTION_QUEUE_MAX)
+    detection_task = asyncio.create_task(detection_flush_loop())
     yield
+    for task in (flush_task, gateway_task, detection_task):
+        task.cancel()
+        try:
+            await task
+        except asyncio.CancelledError:
+            pass
+    flush_events()
     print("Ingest Service shutting down...")
 
 app = FastAPI(
     title="Threat_Ops.ai - Ingest Service",
     description="Telemetry ingestion service",
     version="1.0.0",
-    lifespan=lifespan
+    lifespan=lifespan,
+    default_response_class=ORJSONResponse
 )
 
 app.add_middleware(
@@ -107,22 +231,22 @@ async def register_node(data: dict):
 @app.get("/nodes", tags=["Fleet"])
 async def list_nodes():
     """List all registered nodes with status"""
-    # Update status based on last_seen (offline if > 30s)
+    # Update status based on last_seen (offline if > 30s), counting
+    # online nodes per sector in the same pass
     current_time = time.time()
-    for node_id, node in NODE_REGISTRY.items():
+    sectors = {"healthcare": 0, "agriculture": 0, "urban": 0}
+    for node in NODE_REGISTRY.values():
         if current_time - node["last_seen"] > 30:
             node["status"] = "offline"
         else:
             node["status"] = "online"
+            if node["sector"] in sectors:
+                sectors[node["sector"]] += 1
 
     return {
         "nodes": list(NODE_REGISTRY.values()),
         "count": len(NODE_REGISTRY),
-        "sectors": {
-            "healthcare": sum(1 for n in NODE_REGISTRY.values() if n["sector"] == "healthcare" and n["status"] == "online"),
-            "agriculture": sum(1 for n in NODE_REGISTRY.values() if n["sector"] == "agriculture" and n["status"] == "online"),
-            "urban": sum(1 for n in NODE_REGISTRY.values() if n["sector"] == "urban" and n["status"] == "online"),
-        }
+        "sectors": sectors
     }
 
 @app.get("/nodes/{node_id}", tags=["Fleet"])
@@ -158,10 +282,12 @@ async def ingest_event(event_input: TelemetryEventInput):
         )
 
         event_dict = normalized_event.model_dump()
-        stored = store_event(event_dict)
+        slim_event = without_fleet_snapshot(event_dict)
+        stored = store_event(slim_event)
 
         if not stored:
             raise HTTPException(status_code=500, detail="Failed to store event")
+        request_flush()
 
         await sio.emit('telemetry', event_dict)
 
@@ -176,31 +302,14 @@ async def ingest_event(event_input: TelemetryEventInput):
         print(f"Ingested event: {event_id} from {event_input.source_ip}")
 
         try:
-            async with aiohttp.ClientSession() as session:
-                async with session.post(
-                    f"{DETECTION_ENGINE_URL}/analyze",
-                    json=event_dict,
-                    timeout=aiohttp.ClientTimeout(total=5)
-                ) as resp:
-                    if resp.status == 200:
-                        analysis = await resp.json()
-                        anomalies = analysis.get("anomalies_detected", 0)
-                        if anomalies > 0:
-                            print(f"Detection Engine found {anomalies} anomalies")
-        except Exception as e:
-            print(f"Could not reach Detection Engine: {e}")
+            detection_queue.put_nowait(slim_event)
+        except asyncio.QueueFull:
+            print("Detection queue full, dropping event from analysis")
 
         try:
-            async with aiohttp.ClientSession() as session:
-                async with session.post(
-                    f"{API_GATEWAY_URL}/internal/telemetry",
-                    json=event_dict,
-                    timeout=aiohttp.ClientTimeout(total=5)
-                ) as resp:
-                    if resp.status != 200:
-                        print(f"API Gateway responded: {resp.status}")
-        except Exception as e:
-            print(f"Could not reach API Gateway: {e}")
+            gateway_queue.put_nowait(event_dict)
+        except asyncio.QueueFull:
+            print("Gateway queue full, dropping telemetry broadcast")
 
         return IngestResponse(
             success=True,
@@ -232,11 +341,14 @@ async def delete_events():
 async def ingest_batch(events: list[TelemetryEventInput]):
     ingested = []
     errors = []
+    # One receive time (and default event timestamp) for the whole batch instead of per event
+    received_at = datetime.utcnow().isoformat() + "Z"
+    now = int(time.time())
 
     for i, event_input in enumerate(events):
         try:
             event_id = event_input.event_id or str(uuid.uuid4())
-            timestamp = event_input.timestamp or int(time.time())
+            timestamp = event_input.timestamp or now
 
             normalized_event = TelemetryEvent(
                 event_id=event_id,
@@ -246,11 +358,11 @@ async def ingest_batch(events: list[TelemetryEventInput]):
                 event_type=event_input.event_type,
                 payload=event_input.payload,
                 timestamp=timestamp,
-                received_at=datetime.utcnow().isoformat() + "Z"
+                received_at=received_at
             )
 
             event_dict = normalized_event.model_dump()
-            if store_event(event_dict):
+            if store_event(without_fleet_snapshot(event_dict)):
                 await sio.emit('telemetry', event_dict)
                 ingested.append(event_id)
             else:
@@ -259,6 +371,8 @@ async def ingest_batch(events: list[TelemetryEventInput]):
         except Exception as e:
             errors.append({"index": i, "error": str(e)})
 
+    request_flush()
+
     return {
         "ingested": len(ingested),
         "failed": len(errors),
@@ -1,6 +1,6 @@
 """
 Threat_Ops.ai - Ingest Service Storage
-Simple JSON file storage for demo purposes
+Simple append-only JSON Lines storage for demo purposes
 """
 
 import json
@@ -8,109 +8,150 @@ import os
 from datetime import datetime
 from typing import List, Optional
 from pathlib import Path
+from collections import deque
+from itertools import islice
 import asyncio
 from threading import Lock
 
 # Storage file path
 STORAGE_DIR = Path(__file__).parent / "data"
-EVENTS_FILE = STORAGE_DIR / "events.json"
+EVENTS_FILE = STORAGE_DIR / "events.jsonl"  # one event per line, appended
+LEGACY_EVENTS_FILE = STORAGE_DIR / "events.json"  # pre-JSONL format, migrated on startup
 
 # Thread-safe lock for file operations
 _file_lock = Lock()
 
-# In-memory event counter
-_event_count = 0
+# Keep only the last N events (demo safety)
+MAX_STORED_EVENTS = 1000
+
+# In-memory store is the source of truth; the JSON file is written behind it
+_events: deque = deque(maxlen=MAX_STORED_EVENTS)
+_events_lock = Lock()
+_unflushed = 0  # events stored since the last write
+_file_lines = 0  # events currently in EVENTS_FILE, including ones evicted from memory
+
+# Rewrite the file down to the in-memory events once it holds this many lines
+COMPACT_THRESHOLD = 2 * MAX_STORED_EVENTS
+
+# Flush early once this many events are unflushed
+FLUSH_BATCH_SIZE = 500
+
+
+def _encode(event: dict) -> str:
+    return json.dumps(event, default=str, separators=(",", ":")) + "\n"
+
+
+def _compact(events: List[dict]) -> None:
+    """Rewrite the events file to exactly `events` (caller holds _file_lock)"""
+    global _file_lines
+
+    tmp = EVENTS_FILE.with_suffix(".tmp")
+    with open(tmp, 'w') as f:
+        f.writelines(_encode(e) for e in events)
+    os.replace(tmp, EVENTS_FILE)
+    _file_lines = len(events)
 
 
 def init_storage() -> None:
-    """Initialize storage directory and file"""
-    global _event_count
+    """Initialize storage directory and load persisted events into memory"""
+    global _file_lines
 
     STORAGE_DIR.mkdir(exist_ok=True)
+    _events.clear()
 
-    if not EVENTS_FILE.exists():
-        with open(EVENTS_FILE, 'w') as f:
-            json.dump([], f)
-        _event_count = 0
-    else:
-        # Count existing events
-        try:
+    with _file_lock:
+        if EVENTS_FILE.exists():
+            _file_lines = 0
             with open(EVENTS_FILE, 'r') as f:
-                events = json.load(f)
-                _event_count = len(events)
-        except (json.JSONDecodeError, FileNotFoundError):
-            _event_count = 0
+                for line in f:
+                    try:
+                        _events.append(json.loads(line))
+                        _file_lines += 1
+                    except json.JSONDecodeError:
+                        continue  # torn last line from a crash
+        elif LEGACY_EVENTS_FILE.exists():
+            try:
+                with open(LEGACY_EVENTS_FILE, 'r') as f:
+                    _events.extend(json.load(f))
+            except (json.JSONDecodeError, FileNotFoundError):
+                pass
+            _compact(list(_events))
+            LEGACY_EVENTS_FILE.unlink()
+        else:
+            _compact([])
 
 
 def store_event(event: dict) -> bool:
     """
-    Store a single event to the JSON file.
-    Returns True on success, False on failure.
+    Store a single event in memory; it reaches disk on the next flush.
+    Returns True on success.
     """
-    global _event_count
+    global _unflushed
 
-    try:
-        with _file_lock:
-            # Read existing events
-            events = []
-            if EVENTS_FILE.exists():
-                try:
-                    with open(EVENTS_FILE, 'r') as f:
-                        events = json.load(f)
-                except (json.JSONDecodeError, FileNotFoundError):
-                    events = []
-
-            # Append new event
-            events.append(event)
-
-            # Keep only last 1000 events (demo safety)
-            if len(events) > 1000:
-                events = events[-1000:]
-
-            # Write back
-            with open(EVENTS_FILE, 'w') as f:
-                json.dump(events, f, indent=2, default=str)
-
-            _event_count = len(events)
-            return True
+    with _events_lock:
+        _events.append(event)
+        _unflushed += 1
+    return True
 
-    except Exception as e:
-        print(f"Storage error: {e}")
-        return False
 
+def pending_count() -> int:
+    """Number of events stored since the last flush"""
+    return _unflushed
+
+
+def flush_events() -> int:
+    """
+    Append events stored since the last flush to the events file,
+    compacting it when it grows past COMPACT_THRESHOLD lines.
+    Returns the number of new events written.
+    """
+    global _unflushed, _file_lines
 
-def get_events(limit: int = 100, offset: int = 0) -> List[dict]:
-    """Get stored events with pagination"""
     try:
         with _file_lock:
-            if not EVENTS_FILE.exists():
-                return []
+            with _events_lock:
+                if not _unflushed:
+                    return 0
+                written = _unflushed
+                new_count = min(_unflushed, len(_events))
+                compact = _file_lines + new_count > COMPACT_THRESHOLD
+                batch = list(_events) if compact else list(islice(_events, len(_events) - new_count, None))
+                _unflushed = 0
+
+            if compact:
+                _compact(batch)
+            else:
+                with open(EVENTS_FILE, 'a') as f:
+                    f.writelines(_encode(e) for e in batch)
+                _file_lines += len(batch)
+            return written
 
-            with open(EVENTS_FILE, 'r') as f:
-                events = json.load(f)
+    except Exception as e:
+        print(f"Storage error: {e}")
+        return 0
 
-            # Return newest first
-            events.reverse()
-            return events[offset:offset + limit]
 
-    except (json.JSONDecodeError, FileNotFoundError):
-        return []
+def get_events(limit: int = 100, offset: int = 0) -> List[dict]:
+    """Get stored events with pagination (newest first)"""
+    with _events_lock:
+        return list(islice(reversed(_events), offset, offset + limit))
 
 
 def get_event_count() -> int:
     """Get total number of stored events"""
-    return _event_count
+    return len(_events)
 
 
 def clear_events() -> bool:
     """Clear all stored events (for testing)"""
-    global _event_count
+    global _unflushed
 
     try:
         with _file_lock:
-            with open(EVENTS_FILE, 'w') as f:
-                json.dump([], f)
-            _event_count = 0
+            with _events_lock:
+                _events.clear()
+                _unflushed = 0
+            _compact([])
             return True
     except Exception as e:
         print(f"Clear error: {e}")
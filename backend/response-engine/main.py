@@ -1,5 +1,7 @@
 import os
 import uuid
+import asyncio
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime
 from contextlib import asynccontextmanager
 from typing import List, Optional
@@ -16,12 +18,19 @@ from playbooks import (
     get_action_log,
     clear_all_actions,
     unblock_ip,
+    blocked_ips,
+    isolated_services,
+    throttled_ips,
     ActionResult
 )
 
 PORT = int(os.environ.get("PORT", 8004))
 API_GATEWAY_URL = os.environ.get("API_GATEWAY_URL", "http://localhost:3001")
 
+# Playbooks shell out to iptables/pfctl/netsh (up to 5s each), so they run off
+# the event loop. A single worker keeps the shared block/isolate state race-free.
+playbook_executor: ThreadPoolExecutor = None
+
 class Alert(BaseModel):
     id: str
     title: str
@@ -58,9 +67,12 @@ class HealthResponse(BaseModel):
 
 @asynccontextmanager
 async def lifespan(app: FastAPI):
+    global playbook_executor
+    playbook_executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="playbook")
     print(f"Response Engine running on port {PORT}")
     print(f"Gateway: {API_GATEWAY_URL}")
     yield
+    playbook_executor.shutdown(wait=False)
     print("Response Engine shutting down...")
 
 app = FastAPI(
@@ -90,7 +102,6 @@ async def health_check():
 
 @app.get("/status", tags=["Status"])
 async def get_status():
-    from playbooks import throttled_ips
     return {
         "blocked_ips": get_blocked_ips(),
         "isolated_services": get_isolated_services(),
@@ -120,7 +131,8 @@ async def execute_response(alert: Alert):
     try:
         print(f"Executing response for: {alert.title}")
 
-        results = run_playbook(alert.model_dump())
+        loop = asyncio.get_running_loop()
+        results = await loop.run_in_executor(playbook_executor, run_playbook, alert.model_dump())
 
         actions = []
         for result in results:
@@ -150,34 +162,40 @@ async def execute_response(alert: Alert):
         print(f"Response execution error: {e}")
         raise HTTPException(status_code=500, detail=str(e))
 
-async def emit_action_events(alert: Alert, actions: List[ActionOutput]):
+async def emit_action_event(session: aiohttp.ClientSession, alert: Alert, action: ActionOutput, timestamp: str):
+    """Post one action event to the gateway. Never raises, so one slow post can't sink the rest."""
+    event = {
+        "type": "response_action",
+        "alert_id": alert.id,
+        "action": action.model_dump(),
+        "timestamp": timestamp
+    }
+
     try:
-        async with aiohttp.ClientSession() as session:
-            for action in actions:
-                event = {
-                    "type": "response_action",
-                    "alert_id": alert.id,
-                    "action": action.model_dump(),
-                    "timestamp": datetime.utcnow().isoformat() + "Z"
-                }
-
-                async with session.post(
-                    f"{API_GATEWAY_URL}/internal/device-status",
-                    json=event,
-                    timeout=aiohttp.ClientTimeout(total=5)
-                ) as resp:
-                    if resp.status == 200:
-                        print(f"Action event emitted: {action.action_type}")
-
-                # Sync IP blocks to API Gateway's IP Manager
-                if action.action_type == "block_ip" and action.status == "success":
-                    await sync_block_to_gateway(action.target, alert)
-
-    except aiohttp.ClientError as e:
+        async with session.post(
+            f"{API_GATEWAY_URL}/internal/device-status",
+            json=event,
+            timeout=aiohttp.ClientTimeout(total=5)
+        ) as resp:
+            if resp.status == 200:
+                print(f"Action event emitted: {action.action_type}")
+    except (aiohttp.ClientError, asyncio.TimeoutError) as e:
         print(f"Could not emit action event: {e}")
 
+    # Sync IP blocks to API Gateway's IP Manager
+    if action.action_type == "block_ip" and action.status == "success":
+        await sync_block_to_gateway(session, action.target, alert)
 
-async def sync_block_to_gateway(ip: str, alert: Alert):
+async def emit_action_events(alert: Alert, actions: List[ActionOutput]):
+    # Each post has its own timeout and they run concurrently, so the
+    # slowest action bounds the wait instead of the sum of all of them
+    # All actions of one alert share the emit timestamp
+    timestamp = datetime.utcnow().isoformat() + "Z"
+    async with aiohttp.ClientSession() as session:
+        await asyncio.gather(*(emit_action_event(session, alert, action, timestamp) for action in actions))
+
+
+async def sync_block_to_gateway(session: aiohttp.ClientSession, ip: str, alert: Alert):
     """Sync IP block to API Gateway's centralized IP Manager"""
     if not ip or ip == "unknown" or ip == "N/A":
         return
@@ -203,22 +221,21 @@ async def sync_block_to_gateway(ip: str, alert: Alert):
         }
         severity = severity_map.get(alert.severity, "high")
 
-        async with aiohttp.ClientSession() as session:
-            async with session.post(
-                f"{API_GATEWAY_URL}/ip/block",
-                json={
-                    "ip": ip,
-                    "reason": reason,
-                    "severity": severity,
-                    "duration": None  # Use default based on severity
-                },
-                timeout=aiohttp.ClientTimeout(total=5)
-            ) as resp:
-                if resp.status == 200:
-                    result = await resp.json()
-                    print(f"[Response Engine] Synced block to Gateway: {ip} -> {result.get('message')}")
-                else:
-                    print(f"[Response Engine] Gateway block sync failed: {resp.status}")
+        async with session.post(
+            f"{API_GATEWAY_URL}/ip/block",
+            json={
+                "ip": ip,
+                "reason": reason,
+                "severity": severity,
+                "duration": None  # Use default based on severity
+            },
+            timeout=aiohttp.ClientTimeout(total=5)
+        ) as resp:
+            if resp.status == 200:
+                result = await resp.json()
+                print(f"[Response Engine] Synced block to Gateway: {ip} -> {result.get('message')}")
+            else:
+                print(f"[Response Engine] Gateway block sync failed: {resp.status}")
     except Exception as e:
         print(f"[Response Engine] Could not sync block to Gateway: {e}")
 
@@ -226,8 +243,6 @@ async def sync_block_to_gateway(ip: str, alert: Alert):
 @app.post("/block/{ip}", tags=["Manual"])
 async def manual_block_ip(ip: str, duration: int = 600, reason: str = "manual"):
     """Block an IP via Response Engine (syncs to API Gateway)"""
-    from playbooks import blocked_ips
-
     if ip in blocked_ips:
         return {"status": "already_blocked", "ip": ip}
 
@@ -255,7 +270,8 @@ async def manual_block_ip(ip: str, duration: int = 600, reason: str = "manual"):
 @app.delete("/block/{ip}", tags=["Manual"])
 async def manual_unblock_ip(ip: str):
     """Unblock an IP via Response Engine (syncs to API Gateway)"""
-    if not unblock_ip(ip):
+    loop = asyncio.get_running_loop()
+    if not await loop.run_in_executor(playbook_executor, unblock_ip, ip):
         raise HTTPException(status_code=404, detail="IP not blocked")
 
     # Sync to API Gateway
@@ -274,8 +290,6 @@ async def manual_unblock_ip(ip: str):
 
 @app.post("/isolate/{service}", tags=["Manual"])
 async def manual_isolate_service(service: str):
-    from playbooks import isolated_services
-
     if service in isolated_services:
         return {"status": "already_isolated", "service": service}
 
@@ -284,8 +298,6 @@ async def manual_isolate_service(service: str):
 
 @app.delete("/isolate/{service}", tags=["Manual"])
 async def manual_restore_service(service: str):
-    from playbooks import isolated_services
-
     if service not in isolated_services:
         raise HTTPException(status_code=404, detail="Service not isolated")
 
@@ -294,15 +306,11 @@ async def manual_restore_service(service: str):
 
 @app.post("/throttle/{ip}", tags=["Manual"])
 async def manual_throttle_ip(ip: str, limit: int = 10):
-    from playbooks import throttled_ips
-
     throttled_ips[ip] = limit
     return {"status": "throttled", "ip": ip, "limit": limit, "message": f"IP {ip} throttled to {limit} req/min"}
 
 @app.delete("/throttle/{ip}", tags=["Manual"])
 async def manual_remove_throttle(ip: str):
-    from playbooks import throttled_ips
-
     if ip not in throttled_ips:
         raise HTTPException(status_code=404, detail="IP not throttled")
 
@@ -311,7 +319,8 @@ async def manual_remove_throttle(ip: str):
 
 @app.delete("/reset", tags=["Admin"])
 async def reset_all():
-    clear_all_actions()
+    loop = asyncio.get_running_loop()
+    await loop.run_in_executor(playbook_executor, clear_all_actions)
     return {"status": "reset", "message": "All actions cleared"}
 
 if __name__ == "__main__":
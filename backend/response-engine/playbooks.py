@@ -10,6 +10,7 @@ from enum import Enum
 import json
 import subprocess
 import platform
+import socket
 import os
 
 
@@ -156,7 +157,6 @@ PROTECTED_IPS = set()
 
 def _get_local_ips():
     """Get all local machine IPs to protect from accidental blocking"""
-    import socket
     local_ips = {"127.0.0.1", "localhost", "::1"}
     try:
         # Get hostname-based IP
@@ -437,16 +437,15 @@ def get_action_log() -> List[ActionResult]:
 
 def clear_all_actions():
     """Reset all actions (for testing) - also clears system-level blocks"""
-    global blocked_ips, isolated_services, throttled_ips, action_log
-
     # Unblock all IPs at system level
-    for ip in blocked_ips:
+    for ip in list(blocked_ips):
         _system_unblock_ip(ip)
 
-    blocked_ips = set()
-    isolated_services = set()
-    throttled_ips = {}
-    action_log = []
+    # Clear in place so modules holding a reference see the reset
+    blocked_ips.clear()
+    isolated_services.clear()
+    throttled_ips.clear()
+    action_log.clear()
 
 
 def unblock_ip(ip: str) -> bool:
@@ -1,28 +1,67 @@
+import os
 import torch
 import torch.nn as nn
 import numpy as np
-import pandas as pd
 import joblib
+from joblib import parallel_backend
 from flask import Flask, request, jsonify
 from flask_cors import CORS
 from sklearn.preprocessing import MinMaxScaler
 from datetime import datetime
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from functools import lru_cache
+from itertools import count, islice
+from operator import gt, lt
 
 app = Flask(__name__)
 CORS(app)  # Enable CORS for React Frontend
 
 # --- SYSTEM LOGS (In-Memory Storage for Dashboard) ---
-SYSTEM_LOGS = []
+# Bounded so a long-running service doesn't grow without limit; ids keep
+# counting up after the oldest entries fall off
+MAX_SYSTEM_LOGS = 1000
+SYSTEM_LOGS = deque(maxlen=MAX_SYSTEM_LOGS)
+LOG_IDS = count(1)
 
 # --- CONFIGURATION ---
 DEVICE = torch.device("cpu") # Use CPU for inference (safer for Flask)
 SEQ_LEN_HEALTH = 20
 SEQ_LEN_URBAN = 10
 
+# Batch scoring runs the Web Gatekeeper here while the request thread runs the
+# Network Shield; both release the GIL inside sklearn/torch, so they overlap
+SCORING_POOL = ThreadPoolExecutor(max_workers=2, thread_name_prefix="scoring")
+# Tree-level parallelism for batch forest predicts (single requests stay serial)
+SCORING_N_JOBS = int(os.environ.get("SCORING_N_JOBS", os.cpu_count() or 1))
+
 # --- GLOBAL BUFFERS (To create sequences from live data stream) ---
+class RollingWindow:
+    """Last `size` points kept as one contiguous float32 block.
+    Each point is written twice (at i and i + size), so the current window is
+    always the slice [pos, pos + size) and never has to be re-stacked."""
+    def __init__(self, size, features):
+        self.size = size
+        self.data = np.zeros((2 * size, features), dtype=np.float32)
+        self.pos = 0
+        self.count = 0
+
+    def __len__(self):
+        return self.count
+
+    def append(self, point):
+        self.data[self.pos] = point
+        self.data[self.pos + self.size] = point
+        self.pos = (self.pos + 1) % self.size
+        self.count = min(self.count + 1, self.size)
+
+    def latest(self):
+        """Oldest-to-newest window; a copy, so later appends can't change it mid-inference"""
+        return self.data[self.pos:self.pos + self.size].copy()
+
 data_buffers = {
-    "healthcare": [],
-    "urban": []
+    "healthcare": RollingWindow(SEQ_LEN_HEALTH, 4),
+    "urban": RollingWindow(SEQ_LEN_URBAN, 2)
 }
 
 # ==========================================
@@ -63,6 +102,16 @@ class UrbanForecaster(nn.Module):
 # ==========================================
 print("⚡ Loading A.E.G.I.S. Brains...")
 
+def freeze_for_inference(model, name):
+    """Compile an eval-mode model into a frozen TorchScript graph: weights become
+    constants, dropout is dropped and adjacent ops are fused, so a forward pass
+    no longer dispatches module by module through Python. Falls back to eager."""
+    try:
+        return torch.jit.optimize_for_inference(torch.jit.script(model))
+    except Exception as e:
+        print(f"⚠️ {name} TorchScript freeze failed ({e}). Running eager.")
+        return model
+
 # --- 1. WEB BRAIN (Scikit-Learn) ---
 try:
     web_model = joblib.load("models/web_brain_model.pkl")
@@ -71,6 +120,7 @@ try:
 except FileNotFoundError:
     print("⚠️ Web Brain files not found. Skipping...")
     web_model = None
+    web_vectorizer = None
 
 print("✅ Web Brain Online.",web_model)
 
@@ -86,22 +136,66 @@ except FileNotFoundError:
 # --- 3. NETWORK SHIELD (PyTorch) ---
 net_cols_all = joblib.load("models/network_shield_columns.pkl")
 net_cols = [col for col in net_cols_all if col != 'Binary_Label']
+# column name -> matrix index, so rows only touch the features they actually carry
+NET_COL_INDEX = {col: j for j, col in enumerate(net_cols)}
 net_scaler = joblib.load("models/network_shield_scaler.pkl")
 net_model = GeneralNetworkShield(input_dim=len(net_cols))
 net_model.load_state_dict(torch.load("models/network_shield_ciciot.pth", map_location=DEVICE, weights_only=True))
 net_model.eval()
 
+# Fold the MinMax scaling into the first Linear layer:
+#   W @ (x * scale + min) + b  ==  (W * scale) @ x + (W @ min + b)
+# so the model takes raw feature rows and no separate scaling pass is needed
+with torch.no_grad():
+    first_layer = net_model.net[0]
+    first_layer.bias += first_layer.weight @ torch.from_numpy(net_scaler.min_.astype(np.float32))
+    first_layer.weight *= torch.from_numpy(net_scaler.scale_.astype(np.float32))
+
+# Freeze after the fold so the folded weights are baked into the graph
+net_model = freeze_for_inference(net_model, "Network Shield")
+
 # --- 4. HEALTH BRAIN (PyTorch LSTM) ---
 health_scaler = joblib.load("models/health_brain_scaler.pkl")
+HEALTH_SCALE = health_scaler.scale_.astype(np.float32)
+HEALTH_MIN = health_scaler.min_.astype(np.float32)
 health_model = HealthClassifier(input_dim=4)
 health_model.load_state_dict(torch.load("models/health_brain_pytorch.pth", map_location=DEVICE, weights_only=True))
 health_model.eval()
+health_model = freeze_for_inference(health_model, "Health Brain")
 
 # --- 5. URBAN BRAIN (PyTorch LSTM) ---
 urban_scaler = joblib.load("models/urban_brain_scaler.pkl")
+URBAN_SCALE = urban_scaler.scale_.astype(np.float32)
+URBAN_MIN = urban_scaler.min_.astype(np.float32)
+URBAN_INV_SCALE = (1.0 / urban_scaler.scale_).astype(np.float32)  # for inverse_transform
 urban_model = UrbanForecaster(input_dim=2)
 urban_model.load_state_dict(torch.load("models/urban_brain_pytorch.pth", map_location=DEVICE, weights_only=True))
 urban_model.eval()
+urban_model = freeze_for_inference(urban_model, "Urban Brain")
+
+# Availability is fixed once loading finishes; check these flags per request
+# instead of testing the (possibly None) estimator objects every time
+WEB_BRAIN_READY = web_model is not None and web_vectorizer is not None
+AGRI_BRAIN_READY = agri_model is not None
+
+# The forests keep whatever n_jobs they were trained with (-1 for the web brain),
+# which spins up a thread pool for every one-row predict. Run them serially by
+# default; score_web widens it for batches via parallel_backend.
+if WEB_BRAIN_READY:
+    web_model.n_jobs = None
+    # Emit float32 TF-IDF matrices (half the bytes, and the trees' native dtype);
+    # also covers vectorizers saved before train.py set this
+    web_vectorizer.dtype = np.float32
+if AGRI_BRAIN_READY:
+    agri_model.n_jobs = None
+
+# --- WARM-UP ---
+# Run one dummy pass through each torch model now, so the first live request
+# doesn't pay for lazy kernel/allocator setup
+with torch.inference_mode():
+    net_model(torch.zeros(1, len(net_cols)))
+    health_model(torch.zeros(1, SEQ_LEN_HEALTH, 4))
+    urban_model(torch.zeros(1, SEQ_LEN_URBAN, 2))
 
 print("✅ All Systems Online.")
 
@@ -109,12 +203,192 @@ print("✅ All Systems Online.")
 # 3. HELPER FUNCTIONS
 # ==========================================
 
-def update_buffer(sector, data_point, max_len):
+def update_buffer(sector, data_point):
     """Maintains a rolling window of the last N data points"""
     data_buffers[sector].append(data_point)
-    if len(data_buffers[sector]) > max_len:
-        data_buffers[sector].pop(0)
-    return list(data_buffers[sector])
+    return data_buffers[sector]
+
+def minmax_f32(rows, scale, offset):
+    """Float32 MinMaxScaler.transform with preloaded params: rows * scale + min"""
+    scaled = np.array(rows, dtype=np.float32)
+    scaled *= scale
+    scaled += offset
+    return scaled
+
+def score_network(rows):
+    """Network Shield scores for a list of network_data dicts in one forward pass"""
+    # Fill a zeroed float32 matrix from each row's own keys (missing features stay 0);
+    # scaling is folded into the model's first layer at load
+    net_matrix = np.zeros((len(rows), len(net_cols)), dtype=np.float32)
+    for i, row in enumerate(rows):
+        for col, value in row.items():
+            j = NET_COL_INDEX.get(col)
+            if j is not None and value:
+                net_matrix[i, j] = value
+    net_tensor = torch.from_numpy(net_matrix).to(DEVICE)
+
+    # inference_mode (unlike no_grad) also skips autograd's view/version tracking
+    with torch.inference_mode():
+        return net_model(net_tensor).squeeze(1).tolist()
+
+# Network Shield heuristics: (field, default when missing, comparison, threshold, reason)
+NETWORK_HEURISTICS = (
+    ("Rate", 0, gt, 5000, "High traffic rate"),              # DDoS
+    ("syn_count", 0, gt, 50, "High SYN count"),              # SYN flood
+    ("rst_count", 0, gt, 30, "High RST count"),
+    ("IAT", 1000, lt, 200, "Suspicious packet timing"),      # Low inter-arrival time
+    ("Number", 0, gt, 60, "High packet volume"),
+)
+
+def network_attack_reasons(raw_data):
+    """Reasons the heuristics flag one network_data dict (empty list if clean)"""
+    return [
+        reason for field, default, crosses, threshold, reason in NETWORK_HEURISTICS
+        if crosses(raw_data.get(field, default), threshold)
+    ]
+
+def batch_network_attack_reasons(rows):
+    """network_attack_reasons for a list of rows, checking each heuristic across all rows in one compare"""
+    hits = np.empty((len(NETWORK_HEURISTICS), len(rows)), dtype=bool)
+    for i, (field, default, crosses, threshold, _) in enumerate(NETWORK_HEURISTICS):
+        hits[i] = crosses(np.array([row.get(field, default) for row in rows], dtype=np.float64), threshold)
+    reasons = [[] for _ in rows]
+    for i, j in zip(*np.nonzero(hits)):
+        reasons[j].append(NETWORK_HEURISTICS[i][4])
+    return reasons
+
+def score_web(payloads):
+    """Web Gatekeeper verdicts (0/1) for a list of payloads in one vectorize + predict pass"""
+    try:
+        text_vecs = web_vectorizer.transform(payloads)
+        with parallel_backend("threading", n_jobs=SCORING_N_JOBS):
+            return web_model.predict(text_vecs).tolist()
+    except Exception:
+        return []  # fall back to per-request scoring in analyze_request
+
+@lru_cache(maxsize=4096)
+def score_payload(payload):
+    """Web Gatekeeper verdict (0/1) for one payload. Memoized: scanners, retries and
+    the simulation driver resend the same strings, and the verdict never changes"""
+    return int(web_model.predict(web_vectorizer.transform([payload]))[0])
+
+def analyze_request(req, net_score=None, web_verdict=None, attack_reasons=None, timestamp=None):
+    """Run one request through all detection layers and return its log entry"""
+    # Request Format: { "sector": "agriculture", "network_data": {...}, "payload": "...", "sensor_data": [...] }
+    sector = req.get('sector', 'unknown')
+    timestamp = timestamp or datetime.now().isoformat()  # batches share one
+    response = {"status": "allowed", "threat_level": "low", "messages": []}
+
+    # --- LAYER 1: WEB GATEKEEPER (SQLi/XSS) ---
+    # Prioritize Application Layer Attacks!
+    if 'payload' in req and req['payload']:
+        text = str(req['payload']).lower()
+        # Demo Override: Ensure common simulation payloads are caught even if model drifts
+        # Removed "admin" to avoid false positives on legitimate Brute Force logins
+        heuristic_trigger = any(x in text for x in ["1=1", "union select", "drop table", "script>"])
+
+        is_attack = 0
+        if web_verdict is not None:
+            is_attack = web_verdict  # batch requests arrive pre-scored
+        elif WEB_BRAIN_READY:
+            try:
+                is_attack = score_payload(req['payload'])
+            except:
+                is_attack = 0
+
+        if is_attack == 1 or heuristic_trigger:
+            log_entry = {
+                "id": next(LOG_IDS),
+                "timestamp": timestamp,
+                "sector": sector,
+                "status": "blocked",
+                "threat_level": "critical", # SQLi is critical
+                "source": "Web Gatekeeper",
+                "message": "Malicious Web Payload Detected (SQLi/XSS)",
+                "score": 0.99 # User request: "remove probability" -> Make it confident.
+            }
+            SYSTEM_LOGS.append(log_entry)
+            return log_entry
+
+    # --- LAYER 2: NETWORK SHIELD (CIC-IoT-2023) ---
+    if 'network_data' in req:
+        # Scale & Predict (batch requests arrive pre-scored)
+        if net_score is None:
+            net_score = score_network([req['network_data']])[0]
+
+        # --- HEURISTIC ATTACK DETECTION --- (batch requests arrive pre-checked)
+        if attack_reasons is None:
+            attack_reasons = network_attack_reasons(req['network_data'])
+
+        if attack_reasons:
+            threat_score = min(0.5 + len(attack_reasons) * 0.15, 1.0)
+            log_entry = {
+                "id": next(LOG_IDS),
+                "timestamp": timestamp,
+                "sector": sector,
+                "status": "blocked",
+                "threat_level": "critical",
+                "source": "Network Shield",
+                "message": f"DDoS/Botnet Activity Detected ({', '.join(attack_reasons)})",
+                "score": threat_score
+            }
+            SYSTEM_LOGS.append(log_entry)
+            return log_entry
+
+    # --- LAYER 3: SECTOR SPECIFIC BRAINS ---
+    if 'sensor_data' in req:
+        raw_point = req['sensor_data']
+
+        # --- AGRICULTURE (Random Forest) ---
+        if sector == "agriculture" and AGRI_BRAIN_READY:
+            # RF expects shape (1, features); float32 C-order is what the trees use internally
+            point = np.array([raw_point], dtype=np.float32)
+            prediction = agri_model.predict(point)[0] # 0 or 1
+
+            if prediction == 1:
+                response["status"] = "isolated"
+                response["threat_level"] = "medium"
+                response["source"] = "Agri-Guardian"
+                response["messages"].append("Critical Physics Violation Detected (Synthetic Mismatch)")
+
+        # --- HEALTHCARE (LSTM) ---
+        elif sector == "healthcare":
+            # Points are scaled once on arrival, so a full window is ready as-is
+            buffer = update_buffer("healthcare", minmax_f32(raw_point, HEALTH_SCALE, HEALTH_MIN))
+            if len(buffer) == SEQ_LEN_HEALTH:
+                tensor_seq = torch.from_numpy(buffer.latest()).unsqueeze(0).to(DEVICE)
+
+                with torch.inference_mode():
+                    prob = health_model(tensor_seq).item()
+
+                if prob > 0.7:
+                    response["status"] = "quarantined"
+                    response["threat_level"] = "critical"
+                    response["messages"].append(f"IoMT Traffic Surge (DDoS). Prob: {prob:.2f}")
+
+        # --- URBAN (LSTM) ---
+        elif sector == "urban":
+            buffer = update_buffer("urban", minmax_f32(raw_point, URBAN_SCALE, URBAN_MIN))
+            if len(buffer) == SEQ_LEN_URBAN:
+                tensor_seq = torch.from_numpy(buffer.latest()).unsqueeze(0).to(DEVICE)
+
+                with torch.inference_mode():
+                    prediction = urban_model(tensor_seq).numpy()[0]
+
+                # Inverse-scale in place: prediction is a fresh array, so no temporaries are needed
+                prediction -= URBAN_MIN
+                prediction *= URBAN_INV_SCALE
+                response["prediction"] = prediction.tolist()
+
+    # Log the response before returning
+    log_entry = {
+        "id": next(LOG_IDS),
+        "timestamp": timestamp,
+        "sector": sector,
+        **response
+    }
+    SYSTEM_LOGS.append(log_entry)
+    return log_entry
 
 # ==========================================
 # 4. API ENDPOINTS
@@ -124,164 +398,41 @@ def update_buffer(sector, data_point, max_len):
 def get_dashboard():
     """Return the last 50 system logs for the dashboard"""
     return jsonify({
-        "logs": SYSTEM_LOGS[-50:],
-        "total_logs": len(SYSTEM_LOGS),
+        "logs": list(islice(reversed(SYSTEM_LOGS), 50))[::-1],
+        "total_logs": SYSTEM_LOGS[-1]["id"] if SYSTEM_LOGS else 0,
         "timestamp": datetime.now().isoformat()
     })
 
 @app.route('/api/analyze', methods=['POST'])
 def analyze_packet():
     try:
-        # Request Format: { "sector": "agriculture", "network_data": {...}, "payload": "...", "sensor_data": [...] }
-        req = request.json
-        sector = req.get('sector', 'unknown')
-        response = {"status": "allowed", "threat_level": "low", "messages": []}
-
-        # --- LAYER 1: WEB GATEKEEPER (SQLi/XSS) ---
-        # Prioritize Application Layer Attacks!
-        if 'payload' in req and req['payload']:
-            text = str(req['payload']).lower()
-            # Demo Override: Ensure common simulation payloads are caught even if model drifts
-            # Removed "admin" to avoid false positives on legitimate Brute Force logins
-            heuristic_trigger = any(x in text for x in ["1=1", "union select", "drop table", "script>"])
-
-            is_attack = 0
-            if web_model:
-                try:
-                    text_vec = web_vectorizer.transform([req['payload']])
-                    is_attack = web_model.predict(text_vec)[0]
-                except:
-                    is_attack = 0
-
-            if is_attack == 1 or heuristic_trigger:
-                log_entry = {
-                    "id": len(SYSTEM_LOGS) + 1,
-                    "timestamp": datetime.now().isoformat(),
-                    "sector": sector,
-                    "status": "blocked",
-                    "threat_level": "critical", # SQLi is critical
-                    "source": "Web Gatekeeper",
-                    "message": "Malicious Web Payload Detected (SQLi/XSS)",
-                    "score": 0.99 # User request: "remove probability" -> Make it confident.
-                }
-                SYSTEM_LOGS.append(log_entry)
-                return jsonify(log_entry)
-
-        # --- LAYER 2: NETWORK SHIELD (CIC-IoT-2023) ---
-        if 'network_data' in req:
-            net_df = pd.DataFrame([req['network_data']])
-            # Align columns
-            for col in net_cols:
-                if col not in net_df.columns:
-                    net_df[col] = 0
-            net_df = net_df[net_cols]
-
-            # Scale & Predict
-            net_scaled = net_scaler.transform(net_df.values)
-            net_tensor = torch.FloatTensor(net_scaled).to(DEVICE)
-
-            with torch.no_grad():
-                net_score = net_model(net_tensor).item()
-
-            # --- HEURISTIC ATTACK DETECTION ---
-            raw_data = req['network_data']
-            is_attack = False
-            attack_reasons = []
-
-            # High traffic rate (DDoS)
-            if raw_data.get('Rate', 0) > 5000:
-                is_attack = True
-                attack_reasons.append("High traffic rate")
-
-            # High SYN count (SYN flood)
-            if raw_data.get('syn_count', 0) > 50:
-                is_attack = True
-                attack_reasons.append("High SYN count")
-
-            # High RST count
-            if raw_data.get('rst_count', 0) > 30:
-                is_attack = True
-                attack_reasons.append("High RST count")
-
-            # Low IAT
-            if raw_data.get('IAT', 1000) < 200:
-                is_attack = True
-                attack_reasons.append("Suspicious packet timing")
-
-            # High packet volume
-            if raw_data.get('Number', 0) > 60:
-                is_attack = True
-                attack_reasons.append("High packet volume")
-
-            if is_attack:
-                threat_score = min(0.5 + len(attack_reasons) * 0.15, 1.0)
-                log_entry = {
-                    "id": len(SYSTEM_LOGS) + 1,
-                    "timestamp": datetime.now().isoformat(),
-                    "sector": sector,
-                    "status": "blocked",
-                    "threat_level": "critical",
-                    "source": "Network Shield",
-                    "message": f"DDoS/Botnet Activity Detected ({', '.join(attack_reasons)})",
-                    "score": threat_score
-                }
-                SYSTEM_LOGS.append(log_entry)
-                return jsonify(log_entry)
-
-        # --- LAYER 3: SECTOR SPECIFIC BRAINS ---
-        if 'sensor_data' in req:
-            raw_point = req['sensor_data']
-
-            # --- AGRICULTURE (Random Forest) ---
-            if sector == "agriculture" and agri_model:
-                # RF expects shape (1, features)
-                point = np.array([raw_point])
-                prediction = agri_model.predict(point)[0] # 0 or 1
-
-                if prediction == 1:
-                    response["status"] = "isolated"
-                    response["threat_level"] = "medium"
-                    response["source"] = "Agri-Guardian"
-                    response["messages"].append("Critical Physics Violation Detected (Synthetic Mismatch)")
-
-            # --- HEALTHCARE (LSTM) ---
-            elif sector == "healthcare":
-                buffer = update_buffer("healthcare", raw_point, SEQ_LEN_HEALTH)
-                if len(buffer) == SEQ_LEN_HEALTH:
-                    scaled_seq = health_scaler.transform(buffer)
-                    tensor_seq = torch.FloatTensor(scaled_seq).unsqueeze(0).to(DEVICE)
-
-                    with torch.no_grad():
-                        prob = health_model(tensor_seq).item()
-
-                    if prob > 0.7:
-                        response["status"] = "quarantined"
-                        response["threat_level"] = "critical"
-                        response["messages"].append(f"IoMT Traffic Surge (DDoS). Prob: {prob:.2f}")
-
-            # --- URBAN (LSTM) ---
-            elif sector == "urban":
-                buffer = update_buffer("urban", raw_point, 10) # Hardcoded 10 for Urban
-                if len(buffer) == 10:
-                    scaled_seq = urban_scaler.transform(buffer)
-                    tensor_seq = torch.FloatTensor(scaled_seq).unsqueeze(0).to(DEVICE)
-
-                    with torch.no_grad():
-                        prediction = urban_model(tensor_seq).numpy()[0]
-
-                    pred_real = urban_scaler.inverse_transform([prediction])[0]
-                    response["prediction"] = pred_real.tolist()
-
-        # Log the response before returning
-        log_entry = {
-            "id": len(SYSTEM_LOGS) + 1,
-            "timestamp": datetime.now().isoformat(),
-            "sector": sector,
-            **response
-        }
-        SYSTEM_LOGS.append(log_entry)
-        return jsonify(log_entry)
+        return jsonify(analyze_request(request.json))
+    except Exception as e:
+        return jsonify({"error": str(e)}), 500
 
+@app.route('/api/analyze/batch', methods=['POST'])
+def analyze_batch():
+    """Analyze a list of requests, scoring all network rows and all web payloads in one model call each"""
+    try:
+        reqs = request.json
+        web_payloads = [r['payload'] for r in reqs if r.get('payload')]
+        web_future = SCORING_POOL.submit(score_web, web_payloads) if web_payloads and WEB_BRAIN_READY else None
+        net_rows = [r['network_data'] for r in reqs if 'network_data' in r]
+        scores = iter(score_network(net_rows) if net_rows else [])
+        reasons = iter(batch_network_attack_reasons(net_rows) if net_rows else [])
+        web_verdicts = iter(web_future.result() if web_future else [])
+        timestamp = datetime.now().isoformat()
+        results = [
+            analyze_request(
+                r,
+                next(scores) if 'network_data' in r else None,
+                next(web_verdicts, None) if r.get('payload') else None,
+                next(reasons) if 'network_data' in r else None,
+                timestamp
+            )
+            for r in reqs
+        ]
+        return jsonify({"results": results, "count": len(results)})
     except Exception as e:
         return jsonify({"error": str(e)}), 500
 
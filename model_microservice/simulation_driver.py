@@ -29,7 +29,33 @@ except ImportError:
 
 # Configuration
 API_URL = "http://127.0.0.1:5000/api/analyze"
+BATCH_API_URL = f"{API_URL}/batch"
 DELAY_BETWEEN_REQUESTS = 1.5  # seconds
+BATCH_SIZE = 1  # samples per request; >1 sends them together to the batch endpoint
+SEED = None  # set an int to replay the same traffic sequence
+
+# Dedicated generator: seedable, and independent of any other random module user
+rng = random.Random(SEED)
+
+# Fixed attack payloads / colors, built once instead of on every request
+SQL_INJECTION_PAYLOADS = (
+    "'; DROP TABLE users; --",
+    "1' OR '1'='1",
+    "admin'--",
+    "'; SELECT * FROM passwords; --",
+    "1; DELETE FROM traffic_logs WHERE 1=1; --",
+    "' UNION SELECT username, password FROM users --",
+    "<script>alert('XSS')</script>",
+    "'; INSERT INTO admin VALUES('hacker','pwned'); --"
+)
+BLOCKING_STATUSES = frozenset({"blocked", "quarantined", "isolated"})
+
+if HAS_COLOR:
+    SECTOR_COLORS = {
+        "healthcare": Fore.CYAN,
+        "agriculture": Fore.YELLOW,
+        "urban": Fore.MAGENTA
+    }
 
 # ═══════════════════════════════════════════════════════════════
 # HELPER FUNCTIONS
@@ -40,25 +66,20 @@ def print_status(sector, status, message, response_data):
     timestamp = datetime.now().strftime("%H:%M:%S.%f")[:-3]
     
     if HAS_COLOR:
-        if status in ["blocked", "quarantined", "isolated"]:
+        if status in BLOCKING_STATUSES:
             color = Fore.RED
             icon = "🚨 BLOCKED"
         else:
             color = Fore.GREEN
             icon = "✅ ALLOWED"
         
-        sector_colors = {
-            "healthcare": Fore.CYAN,
-            "agriculture": Fore.YELLOW,
-            "urban": Fore.MAGENTA
-        }
-        sector_color = sector_colors.get(sector, Fore.WHITE)
+        sector_color = SECTOR_COLORS.get(sector, Fore.WHITE)
         
         print(f"{Fore.WHITE}[{timestamp}] {sector_color}[{sector.upper():^12}] {color}{icon:^12}{Style.RESET_ALL} │ {message}")
         if response_data.get("score"):
             print(f"{Fore.WHITE}           └─ Threat Score: {Fore.RED}{response_data['score']:.2%}{Style.RESET_ALL}")
     else:
-        icon = "🚨 BLOCKED" if status in ["blocked", "quarantined", "isolated"] else "✅ ALLOWED"
+        icon = "🚨 BLOCKED" if status in BLOCKING_STATUSES else "✅ ALLOWED"
         print(f"[{timestamp}] [{sector.upper():^12}] {icon:^12} │ {message}")
 
 
@@ -79,21 +100,21 @@ def generate_network_data(is_attack=False):
     if is_attack:
         # DDoS Attack signature: triggers heuristic detection
         return {
-            "Header_Length": random.uniform(40, 60),
-            "Protocol Type": random.randint(0, 10),
-            "Time_To_Live": random.randint(1, 30),
-            "Rate": random.uniform(600000, 8000000),      # > 500000 triggers detection
-            "fin_flag_number": random.randint(0, 1),
-            "syn_flag_number": random.randint(0, 1),
-            "rst_flag_number": random.randint(0, 1),
-            "psh_flag_number": random.randint(0, 1),
-            "ack_flag_number": random.randint(0, 1),
+            "Header_Length": rng.uniform(40, 60),
+            "Protocol Type": rng.randint(0, 10),
+            "Time_To_Live": rng.randint(1, 30),
+            "Rate": rng.uniform(600000, 8000000),      # > 500000 triggers detection
+            "fin_flag_number": rng.randint(0, 1),
+            "syn_flag_number": rng.randint(0, 1),
+            "rst_flag_number": rng.randint(0, 1),
+            "psh_flag_number": rng.randint(0, 1),
+            "ack_flag_number": rng.randint(0, 1),
             "ece_flag_number": 0,
             "cwr_flag_number": 0,
-            "ack_count": random.randint(0, 10),
-            "syn_count": random.randint(60, 100),         # > 50 triggers detection
-            "fin_count": random.randint(0, 10),
-            "rst_count": random.randint(40, 100),         # > 30 triggers detection
+            "ack_count": rng.randint(0, 10),
+            "syn_count": rng.randint(60, 100),         # > 50 triggers detection
+            "fin_count": rng.randint(0, 10),
+            "rst_count": rng.randint(40, 100),         # > 30 triggers detection
             "HTTP": 0,
             "HTTPS": 0,
             "DNS": 0,
@@ -109,37 +130,37 @@ def generate_network_data(is_attack=False):
             "IGMP": 0,
             "IPv": 1,
             "LLC": 0,
-            "Tot sum": random.randint(200000, 315024),
-            "Min": random.uniform(42, 100),
-            "Max": random.uniform(10000, 36266),
-            "AVG": random.uniform(2000, 7831),
-            "Std": random.uniform(5000, 11306),
-            "Tot size": random.uniform(3000, 7831),
-            "IAT": random.uniform(10, 150),               # < 200 triggers detection
-            "Number": random.randint(70, 100),            # > 60 triggers detection
-            "Variance": random.uniform(50000000, 127834924)
+            "Tot sum": rng.randint(200000, 315024),
+            "Min": rng.uniform(42, 100),
+            "Max": rng.uniform(10000, 36266),
+            "AVG": rng.uniform(2000, 7831),
+            "Std": rng.uniform(5000, 11306),
+            "Tot size": rng.uniform(3000, 7831),
+            "IAT": rng.uniform(10, 150),               # < 200 triggers detection
+            "Number": rng.randint(70, 100),            # > 60 triggers detection
+            "Variance": rng.uniform(50000000, 127834924)
         }
     else:
         # Normal traffic - stays BELOW all detection thresholds
         return {
-            "Header_Length": random.uniform(20, 40),
-            "Protocol Type": random.randint(0, 5),
-            "Time_To_Live": random.randint(64, 128),
-            "Rate": random.uniform(1000, 100000),         # Well below 500000
-            "fin_flag_number": random.randint(0, 1),
-            "syn_flag_number": random.randint(0, 1),
+            "Header_Length": rng.uniform(20, 40),
+            "Protocol Type": rng.randint(0, 5),
+            "Time_To_Live": rng.randint(64, 128),
+            "Rate": rng.uniform(1000, 100000),         # Well below 500000
+            "fin_flag_number": rng.randint(0, 1),
+            "syn_flag_number": rng.randint(0, 1),
             "rst_flag_number": 0,
-            "psh_flag_number": random.randint(0, 1),
+            "psh_flag_number": rng.randint(0, 1),
             "ack_flag_number": 1,
             "ece_flag_number": 0,
             "cwr_flag_number": 0,
-            "ack_count": random.randint(10, 50),
-            "syn_count": random.randint(0, 20),           # Well below 50
-            "fin_count": random.randint(0, 5),
-            "rst_count": random.randint(0, 10),           # Well below 30
-            "HTTP": random.choice([0, 1]),
-            "HTTPS": random.choice([0, 1]),
-            "DNS": random.choice([0, 1]),
+            "ack_count": rng.randint(10, 50),
+            "syn_count": rng.randint(0, 20),           # Well below 50
+            "fin_count": rng.randint(0, 5),
+            "rst_count": rng.randint(0, 10),           # Well below 30
+            "HTTP": rng.choice([0, 1]),
+            "HTTPS": rng.choice([0, 1]),
+            "DNS": rng.choice([0, 1]),
             "Telnet": 0,
             "SMTP": 0,
             "SSH": 0,
@@ -152,15 +173,15 @@ def generate_network_data(is_attack=False):
             "IGMP": 0,
             "IPv": 1,
             "LLC": 0,
-            "Tot sum": random.randint(120, 10000),
-            "Min": random.uniform(42, 200),
-            "Max": random.uniform(100, 2000),
-            "AVG": random.uniform(46, 500),
-            "Std": random.uniform(0, 500),
-            "Tot size": random.uniform(46, 1000),
-            "IAT": random.uniform(500, 78612),            # Well above 200
-            "Number": random.randint(2, 40),              # Well below 60
-            "Variance": random.uniform(0, 10000)
+            "Tot sum": rng.randint(120, 10000),
+            "Min": rng.uniform(42, 200),
+            "Max": rng.uniform(100, 2000),
+            "AVG": rng.uniform(46, 500),
+            "Std": rng.uniform(0, 500),
+            "Tot size": rng.uniform(46, 1000),
+            "IAT": rng.uniform(500, 78612),            # Well above 200
+            "Number": rng.randint(2, 40),              # Well below 60
+            "Variance": rng.uniform(0, 10000)
         }
 
 
@@ -174,7 +195,7 @@ def simulate_healthcare():
     - Normal: Heart rate 60-100bpm, stable vitals
     - Attack: DDoS on medical devices
     """
-    is_attack = random.random() < 0.60  # 20% attack probability
+    is_attack = rng.random() < 0.60  # 20% attack probability
     
     if is_attack:
         # DDoS Attack on healthcare network
@@ -182,10 +203,10 @@ def simulate_healthcare():
             "sector": "healthcare",
             "network_data": generate_network_data(is_attack=True),
             "sensor_data": [
-                random.uniform(60, 100),    # Heart rate
-                random.uniform(36, 38),     # Temperature
-                random.uniform(95, 100),    # SpO2
-                random.uniform(110, 140)    # Blood pressure systolic
+                rng.uniform(60, 100),    # Heart rate
+                rng.uniform(36, 38),     # Temperature
+                rng.uniform(95, 100),    # SpO2
+                rng.uniform(110, 140)    # Blood pressure systolic
             ]
         }, "DDoS Attack on IoMT Network"
     else:
@@ -194,10 +215,10 @@ def simulate_healthcare():
             "sector": "healthcare",
             "network_data": generate_network_data(is_attack=False),
             "sensor_data": [
-                random.uniform(60, 100),    # Heart rate
-                random.uniform(36.5, 37.5), # Temperature
-                random.uniform(96, 99),     # SpO2
-                random.uniform(110, 130)    # Blood pressure systolic
+                rng.uniform(60, 100),    # Heart rate
+                rng.uniform(36.5, 37.5), # Temperature
+                rng.uniform(96, 99),     # SpO2
+                rng.uniform(110, 130)    # Blood pressure systolic
             ]
         }, "Normal IoMT Telemetry"
 
@@ -208,7 +229,7 @@ def simulate_agriculture():
     - Normal: Reasonable soil/weather readings
     - Attack: Physics violation (impossible sensor readings)
     """
-    is_attack = random.random() < 0.60  # 20% attack probability
+    is_attack = rng.random() < 0.60  # 20% attack probability
     
     if is_attack:
         # Physics Violation: High temperature + Zero moisture = impossible
@@ -216,10 +237,10 @@ def simulate_agriculture():
             "sector": "agriculture",
             "network_data": generate_network_data(is_attack=False),
             "sensor_data": [
-                random.uniform(45, 60),     # Temperature (very high)
+                rng.uniform(45, 60),     # Temperature (very high)
                 0.0,                         # Moisture (zero - impossible with high temp)
-                random.uniform(6.5, 7.5),   # pH
-                random.uniform(100, 200)    # Nitrogen
+                rng.uniform(6.5, 7.5),   # pH
+                rng.uniform(100, 200)    # Nitrogen
             ]
         }, "⚡ Physics Violation: Synthetic Data Injection"
     else:
@@ -228,10 +249,10 @@ def simulate_agriculture():
             "sector": "agriculture",
             "network_data": generate_network_data(is_attack=False),
             "sensor_data": [
-                random.uniform(20, 35),     # Temperature
-                random.uniform(30, 70),     # Moisture
-                random.uniform(6.0, 7.5),   # pH
-                random.uniform(50, 150)     # Nitrogen
+                rng.uniform(20, 35),     # Temperature
+                rng.uniform(30, 70),     # Moisture
+                rng.uniform(6.0, 7.5),   # pH
+                rng.uniform(50, 150)     # Nitrogen
             ]
         }, "Normal Soil Telemetry"
 
@@ -242,28 +263,17 @@ def simulate_urban():
     - Normal: Traffic flow data
     - Attack: SQL Injection in payload
     """
-    is_attack = random.random() < 0.60  # 20% attack probability
-    
-    sql_injection_payloads = [
-        "'; DROP TABLE users; --",
-        "1' OR '1'='1",
-        "admin'--",
-        "'; SELECT * FROM passwords; --",
-        "1; DELETE FROM traffic_logs WHERE 1=1; --",
-        "' UNION SELECT username, password FROM users --",
-        "<script>alert('XSS')</script>",
-        "'; INSERT INTO admin VALUES('hacker','pwned'); --"
-    ]
+    is_attack = rng.random() < 0.60  # 20% attack probability
     
     if is_attack:
         # SQL Injection Attack
         return {
             "sector": "urban",
             "network_data": generate_network_data(is_attack=False),
-            "payload": random.choice(sql_injection_payloads),
+            "payload": rng.choice(SQL_INJECTION_PAYLOADS),
             "sensor_data": [
-                random.uniform(50, 200),    # Vehicle count
-                random.uniform(20, 60)      # Average speed
+                rng.uniform(50, 200),    # Vehicle count
+                rng.uniform(20, 60)      # Average speed
             ]
         }, "💉 SQL Injection Attack Attempt"
     else:
@@ -272,8 +282,8 @@ def simulate_urban():
             "sector": "urban",
             "network_data": generate_network_data(is_attack=False),
             "sensor_data": [
-                random.uniform(50, 150),    # Vehicle count
-                random.uniform(30, 50)      # Average speed
+                rng.uniform(50, 150),    # Vehicle count
+                rng.uniform(30, 50)      # Average speed
             ]
         }, "Normal Traffic Flow"
 
@@ -289,7 +299,7 @@ def main():
     print("║" + " " * 15 + "Nervous System Online" + " " * 21 + "║")
     print("═" * 65)
     print(f"\n🎯 Target: {API_URL}")
-    print(f"⏱️  Delay: {DELAY_BETWEEN_REQUESTS}s between requests")
+    print(f"⏱️  Delay: {DELAY_BETWEEN_REQUESTS}s between requests ({BATCH_SIZE} sample(s) each)")
     print(f"📊 Attack Probability: 20%\n")
     print("─" * 65)
     print(f"{'TIMESTAMP':<15} {'SECTOR':<14} {'STATUS':<14} │ MESSAGE")
@@ -297,23 +307,25 @@ def main():
     
     simulators = [simulate_healthcare, simulate_agriculture, simulate_urban]
     request_count = 0
+    session = requests.Session()  # keep-alive across requests
     
     while True:
         try:
-            # Pick a random sector
-            simulator = random.choice(simulators)
-            payload, description = simulator()
+            # Draw the sector for every sample of the batch in one call
+            samples = [simulate() for simulate in rng.choices(simulators, k=BATCH_SIZE)]
             
-            # Send request to API
+            # Send request to API (one POST for the whole batch)
             try:
-                response = requests.post(API_URL, json=payload, timeout=5)
-                result = response.json()
-                
-                status = result.get("status", "unknown")
-                threat = result.get("threat_level", "low")
-                message = result.get("message", description)
+                if BATCH_SIZE == 1:
+                    results = [session.post(API_URL, json=samples[0][0], timeout=5).json()]
+                else:
+                    response = session.post(BATCH_API_URL, json=[p for p, _ in samples], timeout=5)
+                    results = response.json()["results"]
                 
-                print_status(payload["sector"], status, message, result)
+                for (payload, description), result in zip(samples, results):
+                    status = result.get("status", "unknown")
+                    message = result.get("message", description)
+                    print_status(payload["sector"], status, message, result)
                 
             except requests.exceptions.ConnectionError:
                 if HAS_COLOR:
@@ -327,7 +339,7 @@ def main():
                 print(f"⏰ Request timeout - retrying...")
                 continue
             
-            request_count += 1
+            request_count += len(samples)
             time.sleep(DELAY_BETWEEN_REQUESTS)
             
         except KeyboardInterrupt:
@@ -1,19 +1,21 @@
 import os
+import pickle
+from concurrent.futures import ProcessPoolExecutor
 import torch
 import torch.nn as nn
 import torch.optim as optim
-from torch.utils.data import DataLoader, TensorDataset
 import pandas as pd
 import numpy as np
 import joblib
 from sklearn.feature_extraction.text import TfidfVectorizer
 from sklearn.ensemble import RandomForestClassifier
 from sklearn.preprocessing import MinMaxScaler, LabelEncoder
-from sklearn.model_selection import train_test_split
 from sklearn.metrics import accuracy_score, classification_report
 
 # --- CONFIGURATION ---
 DEVICE = torch.device("cuda" if torch.cuda.is_available() else "cpu")
+# Mixed precision + torch.compile only pay off on GPU; CPU runs stay eager FP32
+USE_AMP = DEVICE.type == "cuda"
 MODELS_DIR = "models"
 DATA_DIR = "datasets"
 
@@ -32,7 +34,7 @@ class GeneralNetworkShield(nn.Module):
         self.net = nn.Sequential(
             nn.Linear(input_dim, 128), nn.ReLU(), nn.Dropout(0.2),
             nn.Linear(128, 64), nn.ReLU(),
-            nn.Linear(64, 1), nn.Sigmoid()
+            nn.Linear(64, 1)  # Logits; BCEWithLogitsLoss applies the sigmoid
         )
     def forward(self, x): return self.net(x)
 
@@ -41,10 +43,9 @@ class HealthClassifier(nn.Module):
         super(HealthClassifier, self).__init__()
         self.lstm = nn.LSTM(input_dim, hidden_dim, batch_first=True, dropout=0.2, num_layers=2)
         self.fc = nn.Linear(hidden_dim, 1)
-        self.sigmoid = nn.Sigmoid()
     def forward(self, x):
         _, (hidden, _) = self.lstm(x)
-        return self.sigmoid(self.fc(hidden[-1]))
+        return self.fc(hidden[-1])  # Logits; inference model in app.py adds the sigmoid
 
 class UrbanForecaster(nn.Module):
     def __init__(self, input_dim=2, hidden_dim=64):
@@ -59,6 +60,34 @@ class UrbanForecaster(nn.Module):
 # 2. TRAINING FUNCTIONS
 # ==========================================
 
+def save_artifact(obj, filename):
+    """Persist a sklearn model/scaler/list with cheap LZ4 compression"""
+    joblib.dump(obj, os.path.join(MODELS_DIR, filename), compress=('lz4', 3), protocol=pickle.HIGHEST_PROTOCOL)
+
+def compile_for_training(model):
+    """Fuse the forward pass with torch.compile on GPU (eager model is kept for saving)"""
+    if USE_AMP:
+        return torch.compile(model, mode="reduce-overhead")
+    return model
+
+def autocast():
+    """BF16 autocast context (no-op on CPU). BF16 keeps FP32 range, so no GradScaler is needed"""
+    return torch.autocast(device_type=DEVICE.type, dtype=torch.bfloat16, enabled=USE_AMP)
+
+def shuffled_batches(x, y, batch_size):
+    """Shuffled minibatches by index permutation, on whatever device x/y already live on.
+    Avoids a DataLoader collating per-sample tuples on every step."""
+    perm = torch.randperm(len(x), device=x.device)
+    for i in range(0, len(x), batch_size):
+        idx = perm[i:i+batch_size]
+        yield x[idx], y[idx]
+
+def make_windows(data, seq_len):
+    """All (n - seq_len) sliding windows of shape (seq_len, features) as one float32 array"""
+    windows = np.lib.stride_tricks.sliding_window_view(data, seq_len, axis=0)[:-1]
+    # sliding_window_view puts the window axis last: (n, features, seq_len) -> (n, seq_len, features)
+    return np.ascontiguousarray(windows.transpose(0, 2, 1), dtype=np.float32)
+
 def train_web_brain():
     print("\n🌐 --- Training Web Brain (SQLi/XSS) ---")
     try:
@@ -67,18 +96,21 @@ def train_web_brain():
         # Map labels: 'norm' -> 0, everything else -> 1
         df['binary_label'] = df['label'].apply(lambda x: 0 if x == 'norm' else 1)
         
-        # Vectorize (Char-level for SQL patterns)
-        vectorizer = TfidfVectorizer(min_df=3, analyzer="char", ngram_range=(2, 4))
+        # Vectorize (Char-level for SQL patterns). float32 is what the forest's trees
+        # compare against, so neither fit nor serving needs a float64 -> float32 copy
+        vectorizer = TfidfVectorizer(min_df=3, analyzer="char", ngram_range=(2, 4), dtype=np.float32)
         X = vectorizer.fit_transform(df['payload'])
         y = df['binary_label']
         
         # Train
-        model = RandomForestClassifier(n_estimators=50, max_depth=20, n_jobs=-1, random_state=42)
+        # Stay within the pool worker's share of cores (set in __main__)
+        n_jobs = int(os.environ.get("OMP_NUM_THREADS", -1))
+        model = RandomForestClassifier(n_estimators=50, max_depth=20, n_jobs=n_jobs, random_state=42)
         model.fit(X, y)
         
         # Save
-        joblib.dump(model, os.path.join(MODELS_DIR, "web_brain_model.pkl"))
-        joblib.dump(vectorizer, os.path.join(MODELS_DIR, "web_brain_vectorizer.pkl"))
+        save_artifact(model, "web_brain_model.pkl")
+        save_artifact(vectorizer, "web_brain_vectorizer.pkl")
         print("✅ Web Brain Saved.")
     except Exception as e:
         print(f"❌ Failed to train Web Brain: {e}")
@@ -113,14 +145,14 @@ def train_agri_brain():
         # Combine
         balanced_df = pd.concat([normal_data, attack_a, attack_b], axis=0).sample(frac=1).reset_index(drop=True)
         
-        # Train
-        X = balanced_df[features]
+        # Train on a row-major float32 matrix: the trees' native layout, so fit skips a conversion copy
+        X = np.ascontiguousarray(balanced_df[features].values, dtype=np.float32)
         y = balanced_df['label']
         clf = RandomForestClassifier(n_estimators=100)
         clf.fit(X, y)
         
         # Save
-        joblib.dump(clf, os.path.join(MODELS_DIR, "agri_brain_model.pkl"))
+        save_artifact(clf, "agri_brain_model.pkl")
         print("✅ Agri Brain Saved.")
     except Exception as e:
         print(f"❌ Failed to train Agri Brain: {e}")
@@ -139,32 +171,30 @@ def train_health_brain():
         
         # Sequence Creation
         SEQ_LEN = 20
-        xs, ys = [], []
-        for i in range(len(X_scaled) - SEQ_LEN):
-            xs.append(X_scaled[i:i+SEQ_LEN])
-            ys.append(y_raw[i+SEQ_LEN])
+        xs = make_windows(X_scaled, SEQ_LEN)
+        ys = y_raw[SEQ_LEN:]
             
-        tensor_x = torch.Tensor(np.array(xs)).to(DEVICE)
-        tensor_y = torch.Tensor(np.array(ys)).unsqueeze(1).to(DEVICE)
-        
-        loader = DataLoader(TensorDataset(tensor_x, tensor_y), batch_size=64, shuffle=True)
+        tensor_x = torch.from_numpy(xs).to(DEVICE)
+        tensor_y = torch.Tensor(ys).unsqueeze(1).to(DEVICE)
         
         model = HealthClassifier(input_dim=4).to(DEVICE)
+        train_model = compile_for_training(model)
         optimizer = optim.Adam(model.parameters(), lr=0.001)
-        criterion = nn.BCELoss()
+        criterion = nn.BCEWithLogitsLoss()
         
         model.train()
         for epoch in range(5):
-            for X_batch, y_batch in loader:
-                optimizer.zero_grad()
-                out = model(X_batch)
-                loss = criterion(out, y_batch)
+            for X_batch, y_batch in shuffled_batches(tensor_x, tensor_y, 64):
+                optimizer.zero_grad(set_to_none=True)
+                with autocast():
+                    out = train_model(X_batch)
+                    loss = criterion(out, y_batch)
                 loss.backward()
                 optimizer.step()
             print(f"   Epoch {epoch+1} Complete")
             
         torch.save(model.state_dict(), os.path.join(MODELS_DIR, "health_brain_pytorch.pth"))
-        joblib.dump(scaler, os.path.join(MODELS_DIR, "health_brain_scaler.pkl"))
+        save_artifact(scaler, "health_brain_scaler.pkl")
         print("✅ Health Brain Saved.")
     except Exception as e:
         print(f"❌ Failed to train Health Brain: {e}")
@@ -182,31 +212,29 @@ def train_urban_brain():
         data_scaled = scaler.fit_transform(data)
         
         SEQ_LEN = 10
-        xs, ys = [], []
-        for i in range(len(data_scaled) - SEQ_LEN):
-            xs.append(data_scaled[i:i+SEQ_LEN])
-            ys.append(data_scaled[i+SEQ_LEN]) # Predict next step
+        xs = make_windows(data_scaled, SEQ_LEN)
+        ys = data_scaled[SEQ_LEN:] # Predict next step
             
-        tensor_x = torch.Tensor(np.array(xs)).to(DEVICE)
-        tensor_y = torch.Tensor(np.array(ys)).to(DEVICE)
-        
-        loader = DataLoader(TensorDataset(tensor_x, tensor_y), batch_size=32, shuffle=True)
+        tensor_x = torch.from_numpy(xs).to(DEVICE)
+        tensor_y = torch.Tensor(ys).to(DEVICE)
         
         model = UrbanForecaster(input_dim=2).to(DEVICE)
+        train_model = compile_for_training(model)
         optimizer = optim.Adam(model.parameters(), lr=0.001)
         criterion = nn.MSELoss()
         
         model.train()
         for epoch in range(10):
-            for X_batch, y_batch in loader:
-                optimizer.zero_grad()
-                out = model(X_batch)
-                loss = criterion(out, y_batch)
+            for X_batch, y_batch in shuffled_batches(tensor_x, tensor_y, 32):
+                optimizer.zero_grad(set_to_none=True)
+                with autocast():
+                    out = train_model(X_batch)
+                    loss = criterion(out, y_batch)
                 loss.backward()
                 optimizer.step()
         
         torch.save(model.state_dict(), os.path.join(MODELS_DIR, "urban_brain_pytorch.pth"))
-        joblib.dump(scaler, os.path.join(MODELS_DIR, "urban_brain_scaler.pkl"))
+        save_artifact(scaler, "urban_brain_scaler.pkl")
         print("✅ Urban Brain Saved.")
     except Exception as e:
         print(f"❌ Failed to train Urban Brain: {e}")
@@ -244,40 +272,57 @@ def train_network_shield():
             df[col] = le.fit_transform(df[col].astype(str))
             encoders[col] = le
             
-        X = df.drop(columns=['Binary_Label']).values
+        # Row-major float32 up front, so each sample's features are contiguous for the
+        # batch gathers below and the scaler can normalize this one buffer in place
+        X = np.ascontiguousarray(df.drop(columns=['Binary_Label']).values, dtype=np.float32)
         y = df['Binary_Label'].values
         
-        scaler = MinMaxScaler()
+        # copy=False: scale X in place instead of allocating a second full-size matrix
+        # (constant columns get scale 1, so there is no divide-by-zero to guard)
+        scaler = MinMaxScaler(copy=False)
         X = scaler.fit_transform(X)
         
-        tensor_x = torch.Tensor(X)
+        tensor_x = torch.from_numpy(X)
         tensor_y = torch.Tensor(y).unsqueeze(1)
         
-        # Train
-        train_idx, _ = train_test_split(range(len(tensor_x)), test_size=0.2)
-        loader = DataLoader(TensorDataset(tensor_x[train_idx], tensor_y[train_idx]), batch_size=2048, shuffle=True)
+        # Train on a random 80%: one index permutation tensor, instead of splitting a
+        # Python range into lists of millions of ints that torch then has to convert
+        n_samples = len(tensor_x)
+        train_idx = torch.randperm(n_samples)[:int(n_samples * 0.8)]
+        # Large batches keep a GPU busy on this shallow MLP; stay small on CPU
+        bs = 16384 if torch.cuda.is_available() else 1024
+        x_train, y_train = tensor_x[train_idx], tensor_y[train_idx]
+        n_train = len(x_train)
+        n_batches = (n_train + bs - 1) // bs
         
         model = GeneralNetworkShield(input_dim=X.shape[1]).to(DEVICE)
+        train_model = compile_for_training(model)
         optimizer = optim.Adam(model.parameters(), lr=0.001)
-        criterion = nn.BCELoss()
+        criterion = nn.BCEWithLogitsLoss()
         
         model.train()
         for epoch in range(3):
-            total_loss = 0
-            for X_batch, y_batch in loader:
-                X_batch, y_batch = X_batch.to(DEVICE), y_batch.to(DEVICE)
-                optimizer.zero_grad()
-                out = model(X_batch)
-                loss = criterion(out, y_batch)
+            # Accumulate on device; a per-step .item() would sync the GPU every batch
+            total_loss = torch.zeros((), device=DEVICE)
+            # Shuffle by index permutation instead of a DataLoader collating per-sample tuples
+            perm = torch.randperm(n_train)
+            for i in range(0, n_train, bs):
+                idx = perm[i:i+bs]
+                X_batch = x_train[idx].to(DEVICE, non_blocking=True)
+                y_batch = y_train[idx].to(DEVICE, non_blocking=True)
+                optimizer.zero_grad(set_to_none=True)
+                with autocast():
+                    out = train_model(X_batch)
+                    loss = criterion(out, y_batch)
                 loss.backward()
                 optimizer.step()
-                total_loss += loss.item()
-            print(f"   Epoch {epoch+1} Loss: {total_loss/len(loader):.4f}")
+                total_loss += loss.detach().float()
+            print(f"   Epoch {epoch+1} Loss: {total_loss.item()/n_batches:.4f}")
             
         # Save
         torch.save(model.state_dict(), os.path.join(MODELS_DIR, "network_shield_ciciot.pth"))
-        joblib.dump(scaler, os.path.join(MODELS_DIR, "network_shield_scaler.pkl"))
-        joblib.dump(list(df.drop(columns=['Binary_Label']).columns), os.path.join(MODELS_DIR, "network_shield_columns.pkl"))
+        save_artifact(scaler, "network_shield_scaler.pkl")
+        save_artifact(list(df.drop(columns=['Binary_Label']).columns), "network_shield_columns.pkl")
         print("✅ Network Shield Saved.")
         
     except Exception as e:
@@ -287,9 +332,18 @@ def train_network_shield():
 # 3. MAIN EXECUTION
 # ==========================================
 if __name__ == "__main__":
-    train_web_brain()
-    train_agri_brain()
-    train_health_brain()
-    train_urban_brain()
-    train_network_shield()
+    # The sklearn forests are CPU-bound and the PyTorch brains GPU-bound, so run
+    # them side by side. Split the cores so the two sides don't oversubscribe BLAS.
+    half_cores = max(1, (os.cpu_count() or 2) // 2)
+    os.environ["OMP_NUM_THREADS"] = str(half_cores)
+    torch.set_num_threads(half_cores)
+
+    with ProcessPoolExecutor(max_workers=2) as pool:
+        f_web = pool.submit(train_web_brain)
+        f_agri = pool.submit(train_agri_brain)
+        train_health_brain()
+        train_urban_brain()
+        train_network_shield()
+        f_web.result()
+        f_agri.result()
     print("\n🏁 --- ALL TRAINING JOBS COMPLETE ---")
\ No newline at end of file
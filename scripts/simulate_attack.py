@@ -1,5 +1,6 @@
 import time
 import requests
+from requests.adapters import HTTPAdapter
 import random
 from datetime import datetime
 
@@ -8,6 +9,11 @@ INGEST_URL = "http://localhost:8001/ingest"
 TARGET_DEVICE = "healthcare-server-01"
 ATTACKER_IP = "192.168.1.66"
 
+# Reuse one keep-alive connection to the Ingest Service
+_SESSION = requests.Session()
+_SESSION.mount('http://', HTTPAdapter(pool_connections=1, pool_maxsize=4, max_retries=0))
+_SESSION.headers.update({'Connection': 'keep-alive'})
+
 ATTACKS = [
     {
         "name": "SQL Injection",
@@ -34,7 +40,7 @@ def send_attack(attack_type):
 
     print(f"⚔️  Launching {attack['name']} against {TARGET_DEVICE}...")
     try:
-        response = requests.post(INGEST_URL, json=data)
+        response = _SESSION.post(INGEST_URL, json=data)
         if response.status_code == 200:
             print(f"✅ Attack payload delivered!")
         else:
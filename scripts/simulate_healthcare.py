@@ -1,5 +1,6 @@
 import time
 import requests
+from requests.adapters import HTTPAdapter
 import random
 import json
 from datetime import datetime
@@ -9,6 +10,11 @@ INGEST_URL = "http://localhost:8001/ingest"
 DEVICE_ID = "healthcare-server-01"
 DEVICE_NAME = "Healthcare Server"
 
+# Reuse one keep-alive connection to the Ingest Service
+_SESSION = requests.Session()
+_SESSION.mount('http://', HTTPAdapter(pool_connections=1, pool_maxsize=4, max_retries=0))
+_SESSION.headers.update({'Connection': 'keep-alive'})
+
 def get_telemetry():
     """Generate realistic server telemetry"""
     return {
@@ -33,7 +39,7 @@ def main():
         while True:
             data = get_telemetry()
             try:
-                response = requests.post(INGEST_URL, json=data)
+                response = _SESSION.post(INGEST_URL, json=data)
                 if response.status_code == 200:
                     print(f"✅ [{datetime.now().strftime('%H:%M:%S')}] Heartbeat sent: CPU={int(data['payload']['cpu'])}%")
                 else:
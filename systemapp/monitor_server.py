@@ -4,7 +4,9 @@ import json
 import threading
 import socket
 import psutil
+import orjson
 import requests
+from requests.adapters import HTTPAdapter
 from flask import Flask, request, jsonify, render_template
 from flask_cors import CORS
 from datetime import datetime, timezone
@@ -22,6 +24,14 @@ config = {
 def get_server_url():
     return config["MAIN_SERVER_URL"]
 
+# Shared keep-alive session for posts to the Ingest Service (telemetry + events)
+_SESSION = requests.Session()
+_SESSION.mount('http://', HTTPAdapter(pool_connections=1, pool_maxsize=4, max_retries=0))
+_SESSION.headers.update({'Connection': 'keep-alive'})
+
+_JSON_HEADERS = {'Content-Type': 'application/json'}
+_ORJSON_OPTS = orjson.OPT_UTC_Z | orjson.OPT_NAIVE_UTC
+
 # This Device's Identity
 DEVICE_ID = socket.gethostname()
 DEVICE_NAME = f"{DEVICE_ID}-node"
@@ -42,7 +52,25 @@ def get_network_ip():
         # Fallback to gethostbyname
         return socket.gethostbyname(socket.gethostname())
 
-DEVICE_IP = get_network_ip()
+# Resolved lazily and refreshed every DEVICE_IP_TTL seconds so a slow or
+# broken resolver never blocks startup
+DEVICE_IP_TTL = 300  # seconds
+_device_ip_cache = {"ip": None, "ts": 0}
+
+def get_device_ip():
+    """Return this node's network IP, resolving it at most once per TTL"""
+    now = time.time()
+    if _device_ip_cache["ts"] and now - _device_ip_cache["ts"] < DEVICE_IP_TTL:
+        return _device_ip_cache["ip"] or "127.0.0.1"
+    # Failed lookups are timestamped too, so a dead network costs one slow
+    # lookup per TTL rather than one per call
+    _device_ip_cache["ts"] = now
+    try:
+        _device_ip_cache["ip"] = get_network_ip()
+    except Exception as e:
+        # Keep serving the last known IP through transient resolver failures
+        print(f"⚠️ Could not resolve device IP: {e}")
+    return _device_ip_cache["ip"] or "127.0.0.1"
 
 # ==========================================
 # FLASK APP (The "Trap Door" for Attacks)
@@ -53,13 +81,15 @@ CORS(app)  # Allow attacks from web UI
 # ==========================================
 # SECURITY: Rate Limiting & Attack Detection
 # ==========================================
-from collections import defaultdict
+from collections import defaultdict, deque
 import re
 import random
 import uuid
 
-# Rate limiter storage: {ip: [timestamps]}
-rate_limit_store = defaultdict(list)
+# Rate limiter storage: {ip: deque of timestamps, oldest first}
+rate_limit_store = defaultdict(deque)
+# Flask serves requests on threads, so pruning and appending must not interleave
+rate_limit_lock = threading.Lock()
 RATE_LIMIT_WINDOW = 10  # seconds
 RATE_LIMIT_MAX = 5000     # max requests per window (Increased for demo/testing)
 
@@ -113,7 +143,7 @@ def send_security_event(event_type, payload, attacker_ip=None):
 
     data = {
         "event_id": str(uuid.uuid4()),
-        "source_ip": attacker_ip or DEVICE_IP,  # Use attacker IP if provided
+        "source_ip": attacker_ip or get_device_ip(),  # Use attacker IP if provided
         "service": DEVICE_NAME,
         "event_type": event_type,
         "payload": payload,
@@ -122,7 +152,8 @@ def send_security_event(event_type, payload, attacker_ip=None):
     }
 
     try:
-        requests.post(get_server_url(), json=data, timeout=1)
+        body = orjson.dumps(data, option=_ORJSON_OPTS)
+        _SESSION.post(get_server_url(), data=body, headers=_JSON_HEADERS, timeout=1)
     except Exception as e:
         print(f"⚠️ Failed to send event {event_type}: {e}")
 
@@ -135,6 +166,7 @@ SECTOR_BLOCK_RATE = 0.80  # 80% of sector attacks blocked
 # ==========================================
 SECTOR = "healthcare"  # Default sector (can be changed via config)
 DEVICE_REGISTRY = {}
+DEVICE_IDS = ()  # Registry keys, fixed until the next init_devices()
 TARGET_DEVICE = None  # Currently selected target device
 
 DEFAULT_DEVICES = {
@@ -156,12 +188,13 @@ DEFAULT_DEVICES = {
 
 def init_devices(sector):
     """Reset registry to sector defaults"""
-    global DEVICE_REGISTRY, TARGET_DEVICE
+    global DEVICE_REGISTRY, DEVICE_IDS, TARGET_DEVICE
     defaults = DEFAULT_DEVICES.get(sector, DEFAULT_DEVICES["healthcare"])
     DEVICE_REGISTRY.clear()
     for k, v in defaults.items():
         DEVICE_REGISTRY[k] = v.copy()
         DEVICE_REGISTRY[k]["sector"] = sector
+    DEVICE_IDS = tuple(DEVICE_REGISTRY)
     TARGET_DEVICE = None  # Clear target on sector change
     print(f"🔄 Device Registry re-initialized for Sector: {sector}")
 
@@ -171,8 +204,8 @@ def get_target_device():
     if TARGET_DEVICE and TARGET_DEVICE in DEVICE_REGISTRY:
         return TARGET_DEVICE
     # Pick random device if no target selected
-    if DEVICE_REGISTRY:
-        return random.choice(list(DEVICE_REGISTRY.keys()))
+    if DEVICE_IDS:
+        return random.choice(DEVICE_IDS)
     return None
 
 def update_device_health(device_id, damage=0):
@@ -223,28 +256,33 @@ SQLI_REGEX = re.compile('|'.join(SQLI_PATTERNS), re.IGNORECASE)
 
 def is_rate_limited(ip):
     """Check if IP exceeds rate limit"""
-    now = time.time()
-
-    # Clean expired blocks
-    if ip in block_expiry and now > block_expiry[ip]:
-        blocked_ips.discard(ip)
-        del block_expiry[ip]
+    with rate_limit_lock:
+        now = time.time()
 
-    if ip in blocked_ips:
-        return True
+        # Clean expired blocks
+        if ip in block_expiry and now > block_expiry[ip]:
+            blocked_ips.discard(ip)
+            del block_expiry[ip]
 
-    # Clean old timestamps
-    rate_limit_store[ip] = [t for t in rate_limit_store[ip] if now - t < RATE_LIMIT_WINDOW]
-    rate_limit_store[ip].append(now)
+        if ip in blocked_ips:
+            return True
 
-    if len(rate_limit_store[ip]) > RATE_LIMIT_MAX:
-        # Block this IP
-        blocked_ips.add(ip)
-        block_expiry[ip] = now + BLOCK_DURATION
-        print(f"🚫 [BLOCKED] IP {ip} exceeded rate limit - blocked for {BLOCK_DURATION}s")
-        return True
+        # Timestamps arrive in order, so expired ones are all at the left end;
+        # pop just those instead of rebuilding the whole window every request
+        timestamps = rate_limit_store[ip]
+        cutoff = now - RATE_LIMIT_WINDOW
+        while timestamps and timestamps[0] <= cutoff:
+            timestamps.popleft()
+        timestamps.append(now)
+
+        if len(timestamps) > RATE_LIMIT_MAX:
+            # Block this IP
+            blocked_ips.add(ip)
+            block_expiry[ip] = now + BLOCK_DURATION
+            print(f"🚫 [BLOCKED] IP {ip} exceeded rate limit - blocked for {BLOCK_DURATION}s")
+            return True
 
-    return False
+        return False
 
 def detect_sqli(query):
     """Detect SQL injection patterns"""
@@ -282,9 +320,15 @@ def check_rate_limit():
 # Initialize devices on startup
 init_devices(SECTOR)
 
+# The dashboard template takes no context, so render it once and reuse the HTML
+_index_html = None
+
 @app.route('/')
 def home():
-    return render_template('index.html')
+    global _index_html
+    if _index_html is None:
+        _index_html = render_template('index.html')
+    return _index_html
 
 @app.route('/status')
 def status():
@@ -371,7 +415,7 @@ def health():
             "network": network_count,
             "requests_per_second": current_rps,
             "uptime_seconds": uptime_seconds,
-            "device_ip": DEVICE_IP,
+            "device_ip": get_device_ip(),
             "boot_time": boot_time.strftime("%Y-%m-%d %H:%M:%S"),
             "sector": SECTOR,
             "device_count": len(DEVICE_REGISTRY),
@@ -656,11 +700,14 @@ def traffic_endpoint():
         return jsonify({"error": "Traffic anomaly blocked", "blocked": True, "device_id": device_id}), 403
     return jsonify({"status": "received", "warning": "traffic_anomaly", "device_id": device_id, "health": dev_status["health"] if dev_status else None}), 200
 
+TELEMETRY_INTERVAL = 2.0  # seconds
+
 def telemetry_loop():
     """Constantly reports system health"""
     global request_count, last_telemetry_time
     print(f"🚑 Telemetry Agent started. Reporting to {get_server_url()}")
     consecutive_failures = 0
+    next_deadline = time.monotonic()
     while True:
         try:
             # Gather Real System Stats
@@ -688,10 +735,10 @@ def telemetry_loop():
                 network_count = 0  # Fallback if permission denied
 
             telemetry = {
-                "source_ip": DEVICE_IP,
+                "source_ip": get_device_ip(),
                 "service": DEVICE_NAME,
                 "event_type": "telemetry",
-                "received_at": datetime.now(timezone.utc).isoformat().replace("+00:00", "Z"),
+                "received_at": datetime.now(timezone.utc),  # orjson emits the Z suffix
                 "payload": {
                     "cpu": cpu_percent,
                     "memory": memory_info.percent,
@@ -703,7 +750,8 @@ def telemetry_loop():
                 }
             }
 
-            requests.post(get_server_url(), json=telemetry, timeout=2)
+            body = orjson.dumps(telemetry, option=_ORJSON_OPTS)
+            _SESSION.post(get_server_url(), data=body, headers=_JSON_HEADERS, timeout=2)
             if consecutive_failures > 0:
                 print(f"✅ Telemetry connection restored")
             consecutive_failures = 0
@@ -721,7 +769,13 @@ def telemetry_loop():
             if consecutive_failures == 1:
                 print(f"❌ Telemetry error: {type(e).__name__} - {str(e)}")
 
-        time.sleep(2)
+        # Fixed 2s cadence: sleep until the next deadline, not 2s after the work
+        next_deadline += TELEMETRY_INTERVAL
+        sleep_s = next_deadline - time.monotonic()
+        if sleep_s > 0:
+            time.sleep(sleep_s)
+        else:
+            next_deadline = time.monotonic()  # Fell behind; re-anchor instead of bursting
 
 # ==========================================
 # FLEET REGISTRATION (Multi-Laptop Support)
@@ -738,9 +792,9 @@ def register_with_backend():
     """Register this node with the central backend"""
     try:
         register_url = f"{get_ingest_base_url()}/register"
-        response = requests.post(register_url, json={
+        response = _SESSION.post(register_url, json={
             "node_id": DEVICE_ID,
-            "ip": DEVICE_IP,
+            "ip": get_device_ip(),
             "port": 5050,
             "sector": SECTOR
         }, timeout=5)
@@ -858,7 +912,7 @@ if __name__ == '__main__':
     print(f"║  🛡️  Threat_Ops Universal Agent           ║")
     print(f"║──────────────────────────────────────────║")
     print(f"║  Device: {DEVICE_NAME:<24}        ║")
-    print(f"║  IP:     {DEVICE_IP:<24}        ║")
+    print(f"║  IP:     {get_device_ip():<24}        ║")
     print(f"║  Sector: {SECTOR.upper():<24}        ║")
     print(f"║  Server: {get_server_url():<24}  ║")
     print(f"╚══════════════════════════════════════════╝")